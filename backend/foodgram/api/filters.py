@@ -1,30 +1,66 @@
-from core.models import Recipe, Tag
+import sys
+
+from core.cache import get_timeout, get_version
+from core.models import Favorite, Recipe, ShoppingCart, Tag
+from core.search import ingredient_index, search_recipes
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Exists, OuterRef, Q
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
 
+def get_tag_ids():
+    """Словарь slug -> id тегов, кешируется до изменения тегов."""
+    key = f'tag_ids:{get_version(Tag)}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, get_timeout())
+    return tag_ids
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
 class RecipeFilter(filters.FilterSet):
+    """Все фильтры выражены через EXISTS-подзапросы, поэтому рецепты
+    не дублируются и DISTINCT не нужен."""
     is_favorited = filters.BooleanFilter(
         method='filter_cart_favorite'
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_cart_favorite'
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags'
     )
 
+    def filter_tags(self, queryset, field, value):
+        tag_ids = get_tag_ids()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag_id__in=[tag_ids[slug] for slug in value if slug in tag_ids]
+            )
+        ))
+
     def filter_cart_favorite(self, queryset, field, value):
-        field_map = {'is_in_shopping_cart': 'recipe_in_cart__user',
-                     'is_favorited': 'favorites__user'}
-        if field:
-            if value:
-                return queryset.filter(
-                    **{field_map.get(field): self.request.user}
-                )
-        return queryset
+        model_map = {'is_in_shopping_cart': ShoppingCart,
+                     'is_favorited': Favorite}
+        if not value:
+            return queryset
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(Exists(
+            model_map[field].objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )
+        ))
 
     class Meta:
         model = Recipe
@@ -34,5 +70,69 @@ class RecipeFilter(filters.FilterSet):
                   'tags']
 
 
+class RecipeSearchFilter(SearchFilter):
+    """Полнотекстовый поиск рецептов по названию, описанию
+    и ингредиентам (см. core.search), с сортировкой по релевантности."""
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get(self.search_param, '').strip()
+        if not search:
+            return queryset
+        return search_recipes(queryset, search)
+
+
 class IngredientSearchField(SearchFilter):
     search_param = 'name'
+
+
+class IngredientAutocompleteFilter(IngredientSearchField):
+    """Автодополнение ингредиентов: сначала совпадения по началу
+    названия (по индексу search_name), затем по подстроке,
+    не больше INGREDIENT_AUTOCOMPLETE_LIMIT записей."""
+
+    def get_search_term(self, request):
+        return request.query_params.get(
+            self.search_param, ''
+        ).strip().casefold()
+
+    def get_querysets(self, queryset, search):
+        """Запросы совпадений по началу и по подстроке."""
+        queryset = queryset.order_by('search_name', 'pk')
+        prefix = self.get_prefix_lookup(search, queryset.db)
+        return (queryset.filter(prefix),
+                queryset.filter(search_name__contains=search).exclude(prefix))
+
+    def search(self, queryset, search):
+        """Не больше INGREDIENT_AUTOCOMPLETE_LIMIT ингредиентов
+        для search в нижнем регистре (casefold)."""
+        limit = settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+        prefix, substring = self.get_querysets(queryset, search)
+        result = list(prefix[:limit])
+        if len(result) < limit:
+            result += substring[:limit - len(result)]
+        return result
+
+    def filter_queryset(self, request, queryset, view):
+        search = self.get_search_term(request)
+        if not search or view.action != 'list':
+            return queryset
+        return self.search(queryset, search)
+
+    def get_prefix_lookup(self, search, using):
+        """На PostgreSQL LIKE 'abc%' использует индекс varchar_pattern_ops,
+        SQLite с ESCAPE в LIKE индекс не применяет, поэтому
+        префикс задается диапазоном значений."""
+        if connections[using].vendor == 'postgresql':
+            return Q(search_name__startswith=search)
+        return Q(search_name__gte=search,
+                 search_name__lt=search + chr(sys.maxunicode))
+
+
+class IngredientMemorySearchFilter(IngredientAutocompleteFilter):
+    """Автодополнение ингредиентов по индексу в памяти процесса,
+    без обращения к базе данных."""
+
+    def search(self, queryset, search):
+        return ingredient_index.search(
+            search, settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+        )
@@ -0,0 +1,66 @@
+import hashlib
+import json
+
+from core.cache import get_timeout, get_version
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+
+class CachedResponseMixin:
+    """Кеширование ответов для справочных ReadOnlyModelViewSet.
+
+    Данные хранятся в кеше Django по версии модели (см. core.cache)
+    и адресу запроса вместе с хешем содержимого, ETag вычисляется
+    по хешу и выбранному типу ответа (JSON, HTML). На If-None-Match
+    с тем же ETag возвращается 304 без обращения к базе данных.
+    Ответы хранятся cache_timeout секунд (None - до смены версии),
+    с LocMemCache - не дольше LOCAL_CACHE_TIMEOUT (см.
+    core.cache.get_timeout): ETag по содержимому меняется после
+    истечения записи, даже если версия в процессе устарела."""
+
+    cache_timeout = None
+
+    def get_cache_model(self):
+        return self.queryset.model
+
+    def get_cache_key(self, request, version):
+        key = (f'{self.get_cache_model()._meta.label_lower}:{version}:'
+               f'{request.get_full_path()}')
+        return 'response:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get_digest(self, data):
+        content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def make_etag(self, request, digest):
+        key = f'{request.accepted_media_type}:{digest}'
+        return quote_etag(hashlib.sha256(key.encode()).hexdigest())
+
+    def make_response(self, request, digest, data):
+        etag = self.make_etag(request, digest)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=304)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request, get_version(self.get_cache_model()))
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = (self.get_digest(response.data), response.data)
+            cache.set(key, cached, get_timeout(self.cache_timeout))
+        return self.make_response(request, *cached)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request,
+                                    *args, **kwargs)
@@ -1,8 +1,155 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       replace_query_param)
+from rest_framework.response import Response
+
+
+def estimate_count(queryset):
+    """Оценка количества записей вместо точного COUNT(*):
+    на PostgreSQL - из плана запроса, на остальных СУБД -
+    COUNT(*), закешированный на ESTIMATED_COUNT_TIMEOUT секунд.
+    Для заведомо пустого запроса (.none()) - 0 без обращения к БД."""
+    queryset = queryset.order_by()
+    if queryset.query.is_empty():
+        return 0
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return plan[0]['Plan']['Plan Rows']
+    key = 'count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count,
+                            settings.ESTIMATED_COUNT_TIMEOUT)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Даты с микросекундами: DjangoJSONEncoder округляет их
+    до миллисекунд, и записи внутри одной миллисекунды
+    пропускались бы при переходе на следующую страницу."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по ключу: курсор хранит значения полей
+    сортировки последней записи страницы, следующая страница
+    выбирается условием по ним, без OFFSET и COUNT(*)."""
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, field.lstrip('-'))
+                  for field in self.ordering]
+        return urlsafe_b64encode(
+            json.dumps(values, cls=CursorEncoder).encode()
+        ).decode()
+
+    def decode_cursor(self, request, queryset):
+        """Значения курсора, приведенные к типам полей сортировки.
+        Любой некорректный курсор - ошибка 404, а не 500."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+            if (not isinstance(values, list)
+                    or len(values) != len(self.ordering)):
+                raise ValueError
+            return [
+                self.parse_value(queryset, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (BinasciiError, ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_value(self, queryset, name, value):
+        if value is None or isinstance(value, (list, dict)):
+            raise TypeError
+        if name in queryset.query.annotations:
+            field = queryset.query.annotations[name].output_field
+        else:
+            field = queryset.model._meta.get_field(name)
+        return field.to_python(value)
+
+    def get_position_filter(self, values):
+        """Записи после курсора: (a < x) OR (a = x AND b < y) ..."""
+        position, equal = Q(), {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            position |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.queryset = queryset
+        queryset = queryset.order_by(*self.ordering)
+        values = self.decode_cursor(request, queryset)
+        if values is not None:
+            queryset = queryset.filter(self.get_position_filter(values))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > self.page_size
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': estimate_count(self.queryset),
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data
+        })
 
 
 class PageLimitPagination(PageNumberPagination):
+    """Постраничный вывод по номеру страницы. Если у представления
+    задан cursor_ordering и в запросе есть параметр cursor
+    (для первой страницы - пустой), используется KeysetPagination."""
 
     page_size_query_param = 'limit'
     page_query_param = 'page'
     page_size = 6
+    cursor_query_param = KeysetPagination.cursor_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering and self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(
+                ordering, self.get_page_size(request)
+            )
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,74 @@
+from core.models import Recipe, RecipeIngredient
+from django.contrib.auth import get_user_model
+from django.db.models import (Count, F, FloatField, IntegerField, OuterRef,
+                              Prefetch, Subquery, Window)
+from django.db.models.functions import Cast, RowNumber
+
+User = get_user_model()
+
+PANTRY_ORDERING = ('-coverage', 'cooking_time', '-id')
+
+
+def recipe_read_queryset():
+    """Запрос для чтения рецептов с фиксированным числом обращений к БД:
+    автор через JOIN, теги и ингредиенты двумя prefetch-запросами.
+    Флаги подписки, избранного и корзины берутся из api.relations."""
+    return Recipe.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        )
+    )
+
+
+def pantry_queryset(queryset, ingredient_ids):
+    """Рецепты, в которых есть хотя бы один из ингредиентов, по убыванию
+    доли имеющихся ингредиентов (coverage), затем по времени
+    приготовления. Количества считаются COUNT по RecipeIngredient
+    для каждого рецепта по индексу (recipe, ingredient)."""
+    ingredients = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe')
+    matched = ingredients.filter(ingredient_id__in=ingredient_ids)
+    return queryset.filter(
+        pk__in=RecipeIngredient.objects.filter(
+            ingredient_id__in=ingredient_ids
+        ).values('recipe_id')
+    ).annotate(
+        matched_count=Subquery(
+            matched.annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        ingredients_count=Subquery(
+            ingredients.annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        coverage=(Cast('matched_count', FloatField())
+                  / F('ingredients_count'))
+    ).order_by(*PANTRY_ORDERING)
+
+
+def subscriptions_queryset(user):
+    """Авторы, на которых подписан пользователь."""
+    return User.objects.filter(following__user=user).order_by('id')
+
+
+def attach_recipe_previews(authors, limit=None):
+    """Загружает первые limit рецептов для всех авторов страницы
+    одним запросом с ROW_NUMBER() OVER (PARTITION BY author_id)
+    и сохраняет их в атрибут recipe_previews каждого автора."""
+    authors = list(authors)
+    recipes = Recipe.objects.filter(author__in=authors)
+    if limit:
+        recipes = recipes.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=F('pub_date').desc()
+        )).filter(row_number__lte=limit)
+    previews = {author.pk: [] for author in authors}
+    for recipe in recipes:
+        previews[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recipe_previews = previews[author.pk]
+    return authors
@@ -0,0 +1,40 @@
+from functools import cached_property
+
+from core.models import Favorite, Follow, ShoppingCart
+
+
+class UserRelations:
+    """Подписки, избранное и корзина текущего пользователя.
+    Каждое множество загружается одним запросом при первом
+    обращении и переиспользуется всеми сериализаторами запроса."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def get_ids(self, model, field):
+        if self.user.is_anonymous:
+            return frozenset()
+        return frozenset(
+            model.objects.filter(user=self.user).values_list(field, flat=True)
+        )
+
+    @cached_property
+    def following(self):
+        return self.get_ids(Follow, 'author_id')
+
+    @cached_property
+    def favorites(self):
+        return self.get_ids(Favorite, 'recipe_id')
+
+    @cached_property
+    def cart(self):
+        return self.get_ids(ShoppingCart, 'recipe_id')
+
+
+def get_relations(request):
+    """UserRelations, общие для всего запроса."""
+    relations = getattr(request, '_user_relations', None)
+    if relations is None or relations.user != request.user:
+        relations = UserRelations(request.user)
+        request._user_relations = relations
+    return relations
@@ -0,0 +1,51 @@
+import json
+
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Формат выгрузки списка покупок для ?format=.
+    Сам список отдается потоком из core.shopping_list,
+    через render проходят только сообщения об ошибках."""
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def get_content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+
+class TxtRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class FormatNegotiation(DefaultContentNegotiation):
+    """Формат выгрузки выбирается только по ?format=, без него -
+    первый из renderer_classes. Заголовок Accept не учитывается,
+    чтобы клиенты с Accept: application/json не получали 406."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        requested = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE
+        )
+        if requested:
+            renderers = self.filter_renderers(renderers, requested)
+        renderer = renderers[0]
+        return renderer, renderer.media_type
@@ -1,28 +1,64 @@
-import base64
-
-from core.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                         ShoppingCart, Tag)
+from functools import cached_property
+
+from core.cache import bump_version
+from core.images import (ImageProcessingError, get_thumbnail_url,
+                         process_base64_image)
+from core.models import Ingredient, Recipe, RecipeIngredient, Tag
+from core.search import update_search_documents
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer as DUCreateSerializer
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
+from .relations import get_relations
+
 User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):
-    """Кодирование в битную строку для использования с JSON"""
+    """Кодирование в битную строку для использования с JSON.
+    Изображение проверяется и сжимается в core.images."""
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                return process_base64_image(data.partition(';base64,')[2])
+            except ImageProcessingError as error:
+                raise serializers.ValidationError(str(error))
         return super().to_internal_value(data)
 
 
-class UserCustomSerializer(UserSerializer):
+class ThumbnailField(serializers.ReadOnlyField):
+    """Адрес миниатюры изображения рецепта заданного размера."""
+
+    def __init__(self, size, **kwargs):
+        self.size = size
+        kwargs.setdefault('source', '*')
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        url = get_thumbnail_url(recipe, self.size)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class ReadOnlyFieldsMixin:
+    """Список читаемых полей собирается один раз на сериализатор,
+    а не заново для каждого объекта при many=True."""
+
+    @cached_property
+    def _readable_fields(self):
+        return [field for field in self.fields.values()
+                if not field.write_only]
+
+
+class UserCustomSerializer(ReadOnlyFieldsMixin, UserSerializer):
     """Сериализация полей объекта модели Пользователя и
     получение поля Подписки на пользователя."""
 
@@ -40,9 +76,17 @@ class UserCustomSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return user.is_authenticated and user.follower.filter(author=obj
-                                                              ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.pk in get_relations(self.context['request']).following
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None."""
+    limit = request.query_params.get('recipes_limit')
+    if limit and limit.isdigit():
+        return int(limit)
+    return None
 
 
 class UserCreateSerializer(DUCreateSerializer):
@@ -64,12 +108,38 @@ class UserCreateSerializer(DUCreateSerializer):
                         'email': {'required': True}}
 
 
+class IngredientListSerializer(serializers.ListSerializer):
+    """Проверка ингредиентов рецепта целиком: повторы ищутся по id
+    через множество, все id загружаются одним запросом in_bulk."""
+
+    def validate(self, attrs):
+        ids, duplicates = set(), set()
+        for item in attrs:
+            if item['id'] in ids:
+                duplicates.add(item['id'])
+            ids.add(item['id'])
+        if duplicates:
+            raise serializers.ValidationError(
+                f'Ингредиенты указаны повторно: {sorted(duplicates)}.'
+            )
+        ingredients = Ingredient.objects.in_bulk(ids)
+        missing = ids - ingredients.keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}.'
+            )
+        for item in attrs:
+            item['id'] = ingredients[item['id']]
+        return attrs
+
+
 class IngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = IngredientListSerializer
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -80,7 +150,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ReadOnlyFieldsMixin, serializers.ModelSerializer):
     """Сериализатор объекта модели Теги."""
 
     class Meta:
@@ -88,7 +158,8 @@ class TagSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
+class RecipeIngredientSerializer(ReadOnlyFieldsMixin,
+                                 serializers.ModelSerializer):
     """Сериализатор для промежуточной модели Рецепт-Ингредиент,
     связывает Ингредиент с Рецептом, добавляя поле Amount."""
 
@@ -114,7 +185,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(ReadOnlyFieldsMixin, serializers.ModelSerializer):
     """Чтение рецептов."""
     author = UserCustomSerializer()
     tags = TagSerializer(many=True)
@@ -123,6 +194,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    thumbnail = ThumbnailField('card')
 
     class Meta:
         model = Recipe
@@ -134,25 +206,17 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'thumbnail',
                   'text',
-                  'cooking_time'
+                  'cooking_time',
+                  'favorites_count'
                   ]
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(
-            user=request.user, recipe=obj
-        ).exists()
+        return obj.pk in get_relations(self.context['request']).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request.user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(
-            user=request.user, recipe=obj
-        ).exists()
+        return obj.pk in get_relations(self.context['request']).cart
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -175,77 +239,125 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Не указан ни один тег.')
         return tags
 
-    def validate_ingredients(self, ingredients):
-        ingredient_list = []
+    def set_ingredients(self, recipe, ingredients, existing=None):
+        """Приводит ингредиенты рецепта к переданному списку:
+        добавляет новые строки, обновляет изменившиеся количества
+        и удаляет лишние, не трогая совпадающие строки."""
+        if existing is None:
+            existing = {item.ingredient_id: item
+                        for item in recipe.recipeingredient_set.all()}
+        to_create, to_update = [], []
         for ingredient in ingredients:
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError('Проверьте ингредиенты.')
-            ingredient_list.append(ingredient)
-        return ingredient_list
-
-    def append_ingredients(self, ingredients, recipe):
-        objects = [
-            RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient.get('id'),
-                amount=ingredient.get('amount')
-            )
-            for ingredient in ingredients
-        ]
-        RecipeIngredient.objects.bulk_create(objects)
-
+            item = existing.pop(ingredient['id'].pk, None)
+            if item is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient['id'],
+                    amount=ingredient['amount']
+                ))
+            elif item.amount != ingredient['amount']:
+                item.amount = ingredient['amount']
+                to_update.append(item)
+        if existing:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in existing.values()]
+            ).delete()
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        RecipeIngredient.objects.bulk_create(to_create)
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
-        self.append_ingredients(ingredients, recipe)
+        self.set_ingredients(recipe, ingredients, existing={})
+        update_search_documents([recipe.pk])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        tags = validated_data.pop('tags')
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        instance.tags.set(tags)
-        ingredients = validated_data.pop('ingredients')
-        self.append_ingredients(ingredients, instance)
-        return super().update(instance, validated_data)
+        instance.tags.set(validated_data.pop('tags'))
+        self.set_ingredients(instance, validated_data.pop('ingredients'))
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        # Только переданные поля, чтобы не затереть счетчики,
+        # которые обновляются через F().
+        instance.save(update_fields=list(validated_data))
+        if not validated_data:
+            bump_version(Recipe)
+        update_search_documents([instance.pk])
+        return instance
 
     def to_representation(self, instance):
-        return RecipeReadSerializer(instance, context={
-            'request': self.context.get('request')
-        }).data
+        return RecipeReadSerializer(instance, context=self.context).data
 
 
 class CropRecipeSerializer(serializers.ModelSerializer):
     """Урезанный сериализатор для объекта модели Рецепта,
     для представления во вложенных словарях."""
     image = Base64ImageField()
+    thumbnail = ThumbnailField('preview')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class PantryRecipeSerializer(RecipeReadSerializer):
+    """Рецепт с долей имеющихся ингредиентов."""
+    coverage = serializers.FloatField(read_only=True)
+    matched_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ['coverage',
+                                                     'matched_count']
+
+
+class PantrySerializer(serializers.Serializer):
+    """Список id имеющихся у пользователя ингредиентов."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS
+    )
+
+    def validate_ingredients(self, ingredients):
+        return list(dict.fromkeys(ingredients))
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массовых операций с корзиной и избранным."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
+
+
 class FollowSerializer(UserCustomSerializer):
     """Сериализатор объекта модели Подписки."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj)
-        if limit:
-            queryset = queryset[:int(limit)]
+        if hasattr(obj, 'recipe_previews'):
+            queryset = obj.recipe_previews
+        else:
+            queryset = Recipe.objects.filter(author=obj)
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit:
+                queryset = queryset[:limit]
         return CropRecipeSerializer(queryset, many=True).data
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
+        read_only_fields = ('recipes_count',)
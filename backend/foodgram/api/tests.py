@@ -0,0 +1,763 @@
+import json
+import re
+import shutil
+import tempfile
+from base64 import urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from core.images import ThreadPoolBackend, get_thumbnail_name, make_thumbnails
+from core.models import (Favorite, FeedEntry, Follow, Ingredient, Recipe,
+                         RecipeIngredient, ShoppingCart, Tag)
+from core.search import update_search_documents
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# Запрос на запись и его таблица: INSERT INTO "t", UPDATE "t", DELETE FROM "t"
+WRITE_STATEMENT = re.compile(
+    r'^(INSERT|UPDATE|DELETE)(?: INTO| FROM)? "(\w+)"'
+)
+
+
+def create_recipes(author, count, tags, ingredients):
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт {i}', text='Текст',
+               cooking_time=10, image='core/images/recipe.webp')
+        for i in range(count)
+    )
+    for recipe in recipes:
+        recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+        for recipe in recipes for ingredient in ingredients
+    )
+    return recipes
+
+
+def response_url(url):
+    return 'http://testserver' + url
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT,
+                   IMAGE_PIPELINE_BACKEND='core.images.LocalBackend')
+class APITestCase(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='Pass12345!'
+        )
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='Pass12345!'
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag{i}')
+            for i in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def test_recipe_list_queries(self):
+        create_recipes(self.author, 100, self.tags, self.ingredients)
+        # COUNT, страница, теги, ингредиенты,
+        # подписки, избранное и корзина пользователя.
+        for limit in (1, 6, 100):
+            with self.subTest(limit=limit), self.assertNumQueries(7):
+                response = self.client.get(
+                    '/api/recipes/', {'limit': limit}
+                )
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipe_list_queries_anonymous(self):
+        create_recipes(self.author, 100, self.tags, self.ingredients)
+        client = APIClient()
+        for limit in (1, 6, 100):
+            with self.subTest(limit=limit), self.assertNumQueries(4):
+                response = client.get('/api/recipes/', {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipe_detail_queries(self):
+        recipe, = create_recipes(self.author, 1, self.tags, self.ingredients)
+        with self.assertNumQueries(6):
+            response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(len(response.data['ingredients']), 3)
+        self.assertEqual(len(response.data['tags']), 2)
+
+
+class ThumbnailTest(APITestCase):
+    """Адрес миниатюры строится по Recipe.thumbnails_image,
+    без проверки файла в хранилище при каждом ответе."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe, = create_recipes(
+            self.author, 1, self.tags, self.ingredients
+        )
+        self.recipe.image = self.save_image('recipe.webp')
+        self.recipe.save(update_fields=['image'])
+
+    def save_image(self, name):
+        output = BytesIO()
+        Image.new('RGB', (640, 480)).save(output, 'WEBP')
+        return default_storage.save(
+            f'core/images/{name}', ContentFile(output.getvalue())
+        )
+
+    def get_thumbnail(self):
+        with mock.patch.object(default_storage, 'exists',
+                               side_effect=AssertionError):
+            response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        return response.data['thumbnail']
+
+    def test_original_until_ready(self):
+        self.assertEqual(
+            self.get_thumbnail(), response_url(self.recipe.image.url)
+        )
+        make_thumbnails(self.recipe.image.name)
+        self.assertTrue(self.get_thumbnail().endswith(
+            'thumbnails/card/' + self.recipe.image.name.split('/')[-1]
+        ))
+
+    def test_new_image_not_ready(self):
+        make_thumbnails(self.recipe.image.name)
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image='core/images/other.webp'
+        )
+        self.assertEqual(self.get_thumbnail(), response_url(
+            default_storage.url('core/images/other.webp')
+        ))
+
+    def test_replaced_thumbnails_deleted(self):
+        old_name = self.recipe.image.name
+        make_thumbnails(old_name)
+        new_name = self.save_image('other.webp')
+        Recipe.objects.filter(pk=self.recipe.pk).update(image=new_name)
+        make_thumbnails(new_name)
+        for size in settings.IMAGE_THUMBNAIL_SIZES:
+            with self.subTest(size=size):
+                self.assertFalse(default_storage.exists(
+                    get_thumbnail_name(old_name, size)
+                ))
+                self.assertTrue(default_storage.exists(
+                    get_thumbnail_name(new_name, size)
+                ))
+
+    def test_pool_closes_old_connections(self):
+        task = mock.Mock()
+        with mock.patch('core.images.close_old_connections') as close:
+            ThreadPoolBackend.run(task, 'name')
+        task.assert_called_once_with('name')
+        self.assertEqual(close.call_count, 2)
+
+
+class CachedResponseTest(APITestCase):
+    """Справочные ответы: ETag и 304, ответы из кеша без запросов
+    к базе, сброс при изменении данных, ETag по типу ответа."""
+
+    url = '/api/tags/'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def get(self, etag=None, **headers):
+        if etag is not None:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get(self.url, **headers)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        with self.assertNumQueries(0):
+            response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_cache_hit(self):
+        data = self.get().data
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, data)
+
+    def test_version_bump(self):
+        etag = self.get()['ETag']
+        Tag.objects.create(name='Новый', color='#000010', slug='new')
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('new', [tag['slug'] for tag in response.data])
+
+    def test_etag_by_content(self):
+        # Ответ, заново вычисленный после истечения записи
+        # или в другом процессе, получает тот же ETag.
+        etag = self.get()['ETag']
+        cache.clear()
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_etag_by_media_type(self):
+        json_etag = self.get(HTTP_ACCEPT='application/json')['ETag']
+        html = self.get(json_etag, HTTP_ACCEPT='text/html')
+        self.assertEqual(html.status_code, 200)
+        self.assertNotEqual(html['ETag'], json_etag)
+        self.assertEqual(
+            self.get(html['ETag'], HTTP_ACCEPT='text/html').status_code, 304
+        )
+
+
+class RecipeFilterTest(APITestCase):
+    """Фильтры рецептов по тегам, избранному, корзине и автору
+    не дублируют рецепты."""
+
+    def setUp(self):
+        super().setUp()
+        first, second = self.tags
+        self.recipes = create_recipes(self.author, 4, self.tags, [])
+        for recipe, tags in zip(self.recipes,
+                                ([first, second], [first], [second], [])):
+            recipe.tags.set(tags)
+
+    def get_ids(self, **params):
+        response = self.client.get('/api/recipes/', {'limit': 100, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'],
+                         len(response.data['results']))
+        return sorted(recipe['id'] for recipe in response.data['results'])
+
+    def get_pks(self, *indexes):
+        return sorted(self.recipes[index].pk for index in indexes)
+
+    def test_tags(self):
+        for tags, expected in ((['tag0'], (0, 1)), (['tag1'], (0, 2)),
+                               (['tag0', 'tag1'], (0, 1, 2))):
+            with self.subTest(tags=tags):
+                self.assertEqual(self.get_ids(tags=tags),
+                                 self.get_pks(*expected))
+
+    def test_new_tag(self):
+        tag = Tag.objects.create(name='Новый', color='#000010', slug='new')
+        self.recipes[3].tags.set([tag])
+        self.assertEqual(self.get_ids(tags=['new']), self.get_pks(3))
+
+    def test_favorite_and_cart(self):
+        for index in (0, 1):
+            Favorite.objects.create(user=self.user, recipe=self.recipes[index])
+        for index in (1, 3):
+            ShoppingCart.objects.create(user=self.user,
+                                        recipe=self.recipes[index])
+        self.assertEqual(self.get_ids(is_favorited=1), self.get_pks(0, 1))
+        self.assertEqual(self.get_ids(is_in_shopping_cart=1),
+                         self.get_pks(1, 3))
+        self.assertEqual(
+            self.get_ids(is_favorited=1, is_in_shopping_cart=1,
+                         tags=['tag0', 'tag1']),
+            self.get_pks(1)
+        )
+
+    def test_author(self):
+        create_recipes(self.user, 2, self.tags, [])
+        self.assertEqual(self.get_ids(author=self.author.pk, tags=['tag0']),
+                         self.get_pks(0, 1))
+
+
+class RecipeSearchTest(APITestCase):
+    """Полнотекстовый поиск рецептов по названию, описанию
+    и ингредиентам, индекс следует за изменениями."""
+
+    def setUp(self):
+        super().setUp()
+        self.soup, self.salad = create_recipes(
+            self.author, 2, self.tags, []
+        )
+        Recipe.objects.filter(pk=self.soup.pk).update(
+            name='Борщ', text='Суп на говяжьем бульоне'
+        )
+        Recipe.objects.filter(pk=self.salad.pk).update(
+            name='Салат', text='Свежие овощи'
+        )
+        self.beet = Ingredient.objects.create(name='Свекла',
+                                              measurement_unit='г')
+        RecipeIngredient.objects.create(recipe=self.soup,
+                                        ingredient=self.beet, amount=1)
+        update_search_documents([self.soup.pk, self.salad.pk])
+
+    def search(self, term):
+        response = self.client.get('/api/recipes/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_fields(self):
+        for term in ('борщ', 'бульоне', 'свекла', 'БОР'):
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), [self.soup.pk])
+        self.assertEqual(self.search('овощи'), [self.salad.pk])
+        self.assertEqual(self.search('пицца'), [])
+
+    def test_ingredient_renamed(self):
+        self.beet.name = 'Буряк'
+        self.beet.save()
+        self.assertEqual(self.search('буряк'), [self.soup.pk])
+        self.assertEqual(self.search('свекла'), [])
+
+    def test_recipe_deleted(self):
+        self.soup.delete()
+        self.assertEqual(self.search('борщ'), [])
+
+
+class IngredientSearchTest(APITestCase):
+    """Поиск ингредиентов по началу и по подстроке без учета
+    регистра, в том числе кириллицы на SQLite."""
+
+    def setUp(self):
+        super().setUp()
+        for name in ('Буррата', 'Соль морская', 'Морская капуста'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_prefix(self):
+        for name in ('бур', 'Бур', 'БУРРАТА'):
+            with self.subTest(name=name):
+                self.assertEqual(self.search(name), ['Буррата'])
+
+    def test_prefix_before_substring(self):
+        for name in ('морская', 'МОРСК'):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.search(name), ['Морская капуста', 'Соль морская']
+                )
+
+
+class ShoppingListTest(APITestCase):
+    """Список покупок: суммы ингредиентов и общее время,
+    в том числе для рецептов без ингредиентов."""
+
+    def download(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'txt'}
+        )
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_recipe_without_ingredients(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=75
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        text = self.download()
+        self.assertNotIn('☐', text)
+        self.assertIn('1ч. 15мин.', text)
+
+    def test_totals(self):
+        recipes = create_recipes(self.author, 2, self.tags, self.ingredients)
+        recipes.append(Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=40
+        ))
+        for recipe in recipes:
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        text = self.download()
+        for ingredient in self.ingredients:
+            self.assertIn(f'☐ {ingredient.name} - 2 - г', text)
+        self.assertIn('1ч. 0мин.', text)
+
+    def test_format(self):
+        recipe, = create_recipes(self.author, 1, self.tags, self.ingredients)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        url = '/api/recipes/download_shopping_cart/'
+        for params, accept, content_type in (
+            ({}, 'application/json', 'text/plain'),
+            ({}, '*/*', 'text/plain'),
+            ({'format': 'csv'}, 'application/json', 'text/csv'),
+            ({'format': 'pdf'}, 'text/html', 'application/pdf'),
+        ):
+            with self.subTest(params=params, accept=accept):
+                response = self.client.get(url, params, HTTP_ACCEPT=accept)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(
+                    response['Content-Type'].startswith(content_type)
+                )
+        response = self.client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_empty_cart(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'txt'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeUpdateStatementsTest(APITestCase):
+    """Изменение рецепта записывает только изменившиеся строки."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe, = create_recipes(
+            self.user, 1, self.tags, self.ingredients[:2]
+        )
+
+    def update(self, amounts):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/',
+                {
+                    'tags': [tag.pk for tag in self.tags],
+                    'ingredients': [
+                        {'id': ingredient.pk, 'amount': amount}
+                        for ingredient, amount
+                        in zip(self.ingredients, amounts)
+                    ]
+                },
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        matches = (WRITE_STATEMENT.match(query['sql'])
+                   for query in context.captured_queries)
+        return [match.group(1) for match in matches
+                if match and match.group(2) in ('core_recipeingredient',
+                                                'core_recipe_tags')]
+
+    def get_amounts(self):
+        return list(self.recipe.recipeingredient_set.order_by(
+            'ingredient_id'
+        ).values_list('amount', flat=True))
+
+    def test_change_one_amount(self):
+        statements = self.update([1, 5])
+        self.assertEqual(statements, ['UPDATE'])
+        self.assertEqual(self.get_amounts(), [1, 5])
+
+    def test_add_one_ingredient(self):
+        statements = self.update([1, 1, 3])
+        self.assertEqual(statements, ['INSERT'])
+        self.assertEqual(self.get_amounts(), [1, 1, 3])
+
+    def test_remove_one_ingredient(self):
+        statements = self.update([1])
+        self.assertEqual(statements, ['DELETE'])
+        self.assertEqual(self.get_amounts(), [1])
+
+
+class KeysetPaginationTest(APITestCase):
+    """Постраничный вывод по курсору возвращает все рецепты
+    в порядке (-pub_date, -id), в том числе при одинаковых датах
+    и датах внутри одной миллисекунды."""
+
+    def setUp(self):
+        super().setUp()
+        recipes = create_recipes(self.author, 7, self.tags, [])
+        now = timezone.now().replace(microsecond=500000)
+        offsets = [0, 100, 200, 300, 300, 300, 5000]  # Микросекунды
+        for recipe, offset in zip(recipes, offsets):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now + timedelta(microseconds=offset)
+            )
+
+    def get_cursor_ids(self, limit, url='/api/recipes/', **params):
+        ids = []
+        response = self.client.get(
+            url, {'cursor': '', 'limit': limit, **params}
+        )
+        while True:
+            ids += [recipe['id'] for recipe in response.data['results']]
+            if response.data['next'] is None:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_all_recipes_in_order(self):
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        self.assertEqual(len(expected), 7)
+        for limit in (1, 2, 3):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.get_cursor_ids(limit), expected)
+
+    def test_pantry_order(self):
+        # Доли имеющихся ингредиентов 1, 1, 2/3, 1/2, 1/2, остальные
+        # рецепты без ингредиентов в выдачу не попадают.
+        first, second, third = self.ingredients
+        for ingredients, cooking_time in (
+            ([first], 20), ([first, second], 10), ([first, third], 10),
+            ([second, third], 10), ([first, second, third], 10), ([third], 5)
+        ):
+            create_recipes(self.author, 1, self.tags, ingredients)
+            Recipe.objects.filter(pk=Recipe.objects.latest('id').pk).update(
+                cooking_time=cooking_time
+            )
+        url = '/api/recipes/pantry/'
+        params = {'ingredients': [first.pk, second.pk]}
+        response = self.client.get(url, {'limit': 100, **params})
+        expected = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(expected), 5)
+        for limit in (1, 2, 3):
+            with self.subTest(limit=limit):
+                self.assertEqual(
+                    self.get_cursor_ids(limit, url, **params), expected
+                )
+
+    def test_invalid_cursor(self):
+        for values in (['abc', 1], ['2020-01-01T00:00:00', 'x'],
+                       [None, None], [[1], {}], [1], {}, 'x'):
+            cursor = urlsafe_b64encode(json.dumps(values).encode()).decode()
+            with self.subTest(values=values):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/recipes/', {'cursor': '%%%'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_empty_result(self):
+        for client, params in (
+            (APIClient(), {'is_favorited': 1}),
+            (self.client, {'search': '!!'}),
+        ):
+            with self.subTest(params=params):
+                response = client.get(
+                    '/api/recipes/', {'cursor': '', **params}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['count'], 0)
+                self.assertEqual(response.data['results'], [])
+
+
+class FeedTest(APITestCase):
+    """Лента подписок: рецепты добавляются при подписке и публикации,
+    убираются при отписке и удалении, страницы по курсору."""
+
+    def subscribe(self, method='post'):
+        response = getattr(self.client, method)(
+            f'/api/users/{self.author.pk}/subscribe/'
+        )
+        self.assertIn(response.status_code, (200, 204))
+
+    def get_feed_ids(self, limit=100, **params):
+        ids = []
+        response = self.client.get(
+            '/api/recipes/feed/', {'limit': limit, **params}
+        )
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            if response.data['next'] is None:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def create_recipe(self, author=None):
+        return Recipe.objects.create(
+            author=author or self.author, name='Рецепт', text='Текст',
+            cooking_time=10
+        )
+
+    def test_backfill_on_subscribe(self):
+        recipes = create_recipes(self.author, 3, self.tags, [])
+        create_recipes(self.user, 1, self.tags, [])
+        self.assertEqual(self.get_feed_ids(), [])
+        self.subscribe()
+        self.assertCountEqual(
+            self.get_feed_ids(), [recipe.pk for recipe in recipes]
+        )
+
+    def test_fan_out_on_publish(self):
+        self.subscribe()
+        recipe = self.create_recipe()
+        self.create_recipe(author=self.user)
+        self.assertEqual(self.get_feed_ids(), [recipe.pk])
+
+    def test_trim_on_unsubscribe(self):
+        self.subscribe()
+        self.create_recipe()
+        self.subscribe('delete')
+        self.assertEqual(self.get_feed_ids(), [])
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_recipe_deleted(self):
+        self.subscribe()
+        recipe = self.create_recipe()
+        other = self.create_recipe()
+        recipe.delete()
+        self.assertEqual(self.get_feed_ids(), [other.pk])
+
+    def test_paging(self):
+        recipes = create_recipes(self.author, 7, self.tags, [])
+        now = timezone.now()
+        for recipe, offset in zip(recipes, [0, 100, 100, 100, 200, 300, 0]):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now + timedelta(microseconds=offset)
+            )
+        self.subscribe()
+        expected = list(FeedEntry.objects.filter(user=self.user).order_by(
+            '-pub_date', '-id'
+        ).values_list('recipe_id', flat=True))
+        self.assertEqual(len(expected), 7)
+        for limit in (1, 2, 3):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.get_feed_ids(limit), expected)
+                self.assertEqual(
+                    self.get_feed_ids(limit, cursor=''), expected
+                )
+
+    def test_anonymous(self):
+        response = APIClient().get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 401)
+
+
+class AsgiTest(APITestCase):
+    """Под ASGI (uvicorn) API отвечает так же, как под WSGI."""
+
+    def setUp(self):
+        super().setUp()
+        recipes = create_recipes(
+            self.author, 8, self.tags, self.ingredients
+        )
+        Favorite.objects.create(user=self.user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=recipes[1])
+        Follow.objects.create(user=self.user, author=self.author)
+        self.recipe = recipes[0]
+        self.token = Token.objects.create(user=self.user)
+
+    async def get_async_response(self, url):
+        return await self.async_client.get(
+            url, headers={'Authorization': f'Token {self.token}'}
+        )
+
+    def get_responses(self, url):
+        sync_response = self.client.get(url)
+        async_response = async_to_sync(self.get_async_response)(url)
+        return [(response.status_code, response.getvalue())
+                for response in (sync_response, async_response)]
+
+    def test_same_responses(self):
+        ingredient = self.ingredients[0]
+        for url in (
+            '/api/ingredients/',
+            '/api/ingredients/?name=ингр',
+            f'/api/ingredients/{ingredient.pk}/',
+            '/api/ingredients/0/',
+            '/api/tags/',
+            f'/api/tags/{self.tags[0].pk}/',
+            '/api/recipes/',
+            '/api/recipes/?page=2&limit=3',
+            '/api/recipes/?page=99',
+            '/api/recipes/?tags=tag0&is_favorited=1',
+            '/api/recipes/?cursor=&limit=3',
+            f'/api/recipes/{self.recipe.pk}/',
+            '/api/recipes/0/',
+            '/api/recipes/feed/',
+            f'/api/recipes/pantry/?ingredients={ingredient.pk}',
+            '/api/recipes/download_shopping_cart/?format=txt',
+        ):
+            with self.subTest(url=url):
+                sync_response, async_response = self.get_responses(url)
+                self.assertEqual(async_response, sync_response)
+                self.assertIn(sync_response[0], (200, 404))
+
+
+class ConcurrentToggleTest(TransactionTestCase):
+    """Одновременные запросы на одну пару пользователь-объект:
+    одна запись и один успешный ответ, остальные - 400."""
+
+    parallel_requests = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='Pass12345!'
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='Pass12345!'
+        )
+        # Без изображения, чтобы не запускать создание миниатюр.
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=10
+        )
+
+    def send_parallel(self, method, url, data=None):
+        def send(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                return getattr(client, method)(
+                    url, data, format='json'
+                ).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.parallel_requests) as executor:
+            return sorted(executor.map(send, range(self.parallel_requests)))
+
+    def assert_single_success(self, statuses, success):
+        self.assertEqual(statuses.count(success), 1, statuses)
+        self.assertEqual(statuses.count(400), len(statuses) - 1, statuses)
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assert_single_success(self.send_parallel('post', url), 201)
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assert_single_success(self.send_parallel('delete', url), 204)
+        self.assertFalse(Favorite.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_favorite_bulk(self):
+        url, data = '/api/recipes/favorite/bulk/', {'ids': [self.recipe.pk]}
+        for method, count in (('post', 1), ('delete', 0)):
+            with self.subTest(method=method):
+                statuses = self.send_parallel(method, url, data)
+                self.assertEqual(set(statuses), {200}, statuses)
+                self.assertEqual(Favorite.objects.count(), count)
+                self.recipe.refresh_from_db()
+                self.assertEqual(self.recipe.favorites_count, count)
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        self.assert_single_success(self.send_parallel('post', url), 201)
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+        self.assert_single_success(self.send_parallel('delete', url), 204)
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assert_single_success(self.send_parallel('post', url), 200)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assert_single_success(self.send_parallel('delete', url), 204)
+        self.assertFalse(Follow.objects.exists())
@@ -1,34 +1,40 @@
 from core.helpers import CustomModelViewSet
-from core.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
-from core.pdfgen import pdf_dw
+from core.models import (Favorite, FeedEntry, Ingredient, Recipe, ShoppingCart,
+                         Tag)
+from core.shopping_list import EXPORTS, get_shopping_list
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.utils.module_loading import import_string
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.permissions import (SAFE_METHODS, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.serializers import ValidationError
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from .filters import IngredientSearchField, RecipeFilter
+from .filters import RecipeFilter, RecipeSearchFilter
+from .mixins import CachedResponseMixin
 from .paginators import PageLimitPagination
 from .permissions import IsOwnerOrReadOnly
-from .serializers import (IngredientSerializer, RecipeReadSerializer,
+from .querysets import PANTRY_ORDERING, pantry_queryset, recipe_read_queryset
+from .renderers import CSVRenderer, FormatNegotiation, PDFRenderer, TxtRenderer
+from .serializers import (IngredientSerializer, PantryRecipeSerializer,
+                          PantrySerializer, RecipeReadSerializer,
                           RecipeWriteSerializer, TagSerializer)
 
 User = get_user_model()
 
 
-class IngredientsView(ReadOnlyModelViewSet):
+class IngredientsView(CachedResponseMixin, ReadOnlyModelViewSet):
     """Представление для Ингредиентов"""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientSearchField,)
-    search_fields = ['^name']
+    filter_backends = (import_string(settings.INGREDIENT_SEARCH_FILTER),)
 
 
-class TagView(ReadOnlyModelViewSet):
+class TagView(CachedResponseMixin, ReadOnlyModelViewSet):
     """Представление Тегов"""
 
     queryset = Tag.objects.all()
@@ -36,17 +42,23 @@ class TagView(ReadOnlyModelViewSet):
 
 
 class RecipeView(CustomModelViewSet):
-    """Представление Рецептов с фильтрацией по тегам
+    """Представление Рецептов с фильтрацией по тегам и поиском.
     Включая методы для добавления рецепта в избранное и корзину."""
 
     queryset = Recipe.objects.all()
     pagination_class = PageLimitPagination
+    cursor_ordering = ('-pub_date', '-id')
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
     filterset_class = RecipeFilter
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeSearchFilter)
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return recipe_read_queryset()
+        return super().get_queryset()
 
     def get_serializer_class(self):
-        if self.action == 'GET':
+        if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
@@ -63,12 +75,75 @@ class RecipeView(CustomModelViewSet):
     def shopping_cart(self, *args, **kwargs):
         return self.manage_favorite_cart(ShoppingCart)
 
-    @action(methods=['GET'], detail=False, url_path='download_shopping_cart',
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='favorite/bulk', permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, *args, **kwargs):
+        return self.manage_bulk(Favorite)
+
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='shopping_cart/bulk',
             permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, *args, **kwargs):
+        return self.manage_bulk(ShoppingCart)
+
+    @action(methods=['GET'], detail=False, url_path='feed',
+            permission_classes=[IsAuthenticated])
+    def feed(self, request, *args, **kwargs):
+        """Рецепты авторов из подписок пользователя. Страница читается
+        из ленты (core.feed) по индексу (user, -pub_date, -id),
+        затем рецепты загружаются по id."""
+        entries = self.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user).order_by(
+                *self.cursor_ordering
+            )
+        )
+        recipes = recipe_read_queryset().in_bulk(
+            [entry.recipe_id for entry in entries]
+        )
+        serializer = self.get_serializer(
+            [recipes[entry.recipe_id] for entry in entries
+             if entry.recipe_id in recipes],
+            many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=False, url_path='pantry',
+            cursor_ordering=PANTRY_ORDERING)
+    def pantry(self, request, *args, **kwargs):
+        """Рецепты из имеющихся ингредиентов:
+        ?ingredients=<id>&ingredients=<id>..., сначала рецепты
+        с наибольшей долей имеющихся ингредиентов. Курсор (?cursor=)
+        строится по той же сортировке."""
+        serializer = PantrySerializer(
+            data={'ingredients': request.query_params.getlist('ingredients')}
+        )
+        serializer.is_valid(raise_exception=True)
+        queryset = pantry_queryset(
+            self.filter_queryset(self.get_queryset()),
+            serializer.validated_data['ingredients']
+        )
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            PantryRecipeSerializer(page, many=True,
+                                   context=self.get_serializer_context()).data
+        )
+
+    @action(methods=['GET'], detail=False, url_path='download_shopping_cart',
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[TxtRenderer, CSVRenderer, PDFRenderer],
+            content_negotiation_class=FormatNegotiation)
     def download_cart(self, *args, **kwargs):
-        if not self.request.user.cart.all():
+        """Выгрузка списка покупок, формат задается ?format=txt|csv|pdf."""
+        user = self.request.user
+        shopping_list = get_shopping_list(user)
+        if shopping_list is None:
             raise ValidationError({'errors': 'Корзина пуста.'})
-        content = pdf_dw(self.request)
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename="list.txt"'
+        renderer = self.request.accepted_renderer
+        response = StreamingHttpResponse(
+            EXPORTS[renderer.format](user, shopping_list),
+            content_type=renderer.get_content_type()
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="list.{renderer.format}"'
+        )
         return response
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
+from .cache import bump_version
 from .models import Ingredient, Recipe, RecipeIngredient, Tag
+from .search import update_search_documents
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -22,8 +24,13 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ['author', 'name', 'tags']
     readonly_fields = ('get_favorite_count',)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_documents([form.instance.pk])
+        bump_version(Recipe)
+
     def get_favorite_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     get_favorite_count.short_description = 'Добавлений в избранное'
 
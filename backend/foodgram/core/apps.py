@@ -1,7 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'модели'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import fill_ingredient_search_names, install_recipe_search
+        post_migrate.connect(install_recipe_search, sender=self)
+        post_migrate.connect(fill_ingredient_search_names, sender=self)
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def get_version_key(model, scope=None):
+    key = f'version:{model._meta.label_lower}'
+    if scope is None:
+        return key
+    return f'{key}:{scope}'
+
+
+def get_timeout(timeout=None):
+    """Время жизни данных, закешированных по версии. В LocMemCache
+    у каждого процесса свои версии: смена версии в одном процессе
+    не видна остальным, поэтому там данные живут не дольше
+    LOCAL_CACHE_TIMEOUT секунд. Сами версии не истекают: иначе
+    без изменений данных менялись бы ключи и ETag."""
+    if not isinstance(caches['default'], LocMemCache):
+        return timeout
+    if timeout is None:
+        return settings.LOCAL_CACHE_TIMEOUT
+    return min(timeout, settings.LOCAL_CACHE_TIMEOUT)
+
+
+def get_version(model, scope=None):
+    """Текущая версия данных модели (или ее части, например записей
+    одного пользователя) для ключей кеша. Начальное значение
+    берется от времени, чтобы после вытеснения счетчика из кеша
+    версии не повторялись."""
+    return cache.get_or_set(
+        get_version_key(model, scope), time.time_ns, None
+    )
+
+
+def bump_version(model, scope=None):
+    """Инвалидирует закешированные данные модели."""
+    key = get_version_key(model, scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
@@ -0,0 +1,41 @@
+from itertools import islice
+
+from .models import FeedEntry, Follow, Recipe
+
+BATCH_SIZE = 1000
+
+
+def insert_entries(entries):
+    """Вставляет записи ленты пачками, уже существующие пропускаются."""
+    entries = iter(entries)
+    while batch := list(islice(entries, BATCH_SIZE)):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """Добавляет новый рецепт в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    insert_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                  author_id=recipe.author_id, pub_date=recipe.pub_date)
+        for user_id in followers.iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя рецепты автора при подписке."""
+    recipes = Recipe.objects.filter(
+        author_id=author_id
+    ).order_by().values_list('pk', 'pub_date')
+    insert_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                  author_id=author_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes.iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает рецепты автора из ленты пользователя при отписке."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
@@ -1,11 +1,48 @@
 from http import HTTPStatus
 
-from api.serializers import CropRecipeSerializer
+from api.serializers import CropRecipeSerializer, RecipeIdsSerializer
+from core.cache import bump_version
+from core.models import Favorite, Recipe, ShoppingCart
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.viewsets import ModelViewSet
 
 
+def count_subquery(model, field):
+    """Количество записей model, ссылающихся на объект через field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def create_or_error(model, message='Объект уже существует.', **data):
+    """Создает запись одним INSERT, нарушение уникальности
+    (в том числе при одновременных запросах) возвращает ошибкой 400."""
+    try:
+        with transaction.atomic():
+            return model.objects.create(**data)
+    except IntegrityError:
+        raise ValidationError({'errors': message})
+
+
+def delete_or_error(model, message='Объект не найден.', **data):
+    """Удаляет записи одним DELETE, если удалять нечего - ошибка 400."""
+    deleted, _ = model.objects.filter(**data).delete()
+    if not deleted:
+        raise ValidationError({'errors': message})
+
+
 class CustomModelViewSet(ModelViewSet):
 
     def get_filter_set(self, model, data):
@@ -20,12 +57,10 @@ class CustomModelViewSet(ModelViewSet):
         возвращая сериализованные данные."""
         user = self.request.user
         obj = self.get_object()
-        data = {'user': user, 'recipe': obj}
-        query = relate_model.objects.filter(user=user, recipe=obj)
         if self.request.method == 'POST':
-            if query.exists():
-                raise ValidationError({'errors': 'Объект уже существует.'})
-            relate_model.objects.create(**data)
+            with transaction.atomic():
+                create_or_error(relate_model, user=user, recipe=obj)
+                self.relations_changed(relate_model, [obj.pk], 1)
             serializer = CropRecipeSerializer(
                 instance=obj,
                 context={'request': self.request}
@@ -33,8 +68,64 @@ class CustomModelViewSet(ModelViewSet):
             return Response(serializer.data, status=HTTPStatus.CREATED)
 
         if self.request.method == 'DELETE':
-            if not query.exists():
-                raise ValidationError({'errors': 'Объект не найден.'})
-            query.delete()
+            with transaction.atomic():
+                delete_or_error(relate_model, user=user, recipe=obj)
+                self.relations_changed(relate_model, [obj.pk], -1)
             return Response({'detail': 'Done'},
                             status=HTTPStatus.NO_CONTENT)
+
+    def manage_bulk(self, relate_model):
+        """Массовое добавление и удаление рецептов в корзине и избранном.
+        Существование рецептов и записей проверяется одним запросом,
+        запись - одним INSERT или DELETE. Возвращает статус по каждому id:
+        created, exists, deleted, not_in_list или not_found."""
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = self.request.user
+        related = dict(Recipe.objects.filter(pk__in=ids).annotate(
+            is_related=Exists(relate_model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        ).values_list('pk', 'is_related'))
+        if self.request.method == 'POST':
+            statuses = {True: 'exists', False: 'created'}
+            changed = [pk for pk, is_related in related.items()
+                       if not is_related]
+            with transaction.atomic():
+                relate_model.objects.bulk_create(
+                    [relate_model(user=user, recipe_id=pk) for pk in changed],
+                    ignore_conflicts=True
+                )
+                self.relations_changed(relate_model, changed)
+        else:
+            statuses = {True: 'deleted', False: 'not_in_list'}
+            changed = [pk for pk, is_related in related.items()
+                       if is_related]
+            with transaction.atomic():
+                relate_model.objects.filter(
+                    user=user, recipe_id__in=changed
+                ).delete()
+                self.relations_changed(relate_model, changed)
+        return Response({'results': [
+            {'id': pk, 'status': statuses[related[pk]]
+             if pk in related else 'not_found'}
+            for pk in ids
+        ]})
+
+    def relations_changed(self, relate_model, recipe_ids, delta=None):
+        """Обновляет счетчик избранного у рецептов или сбрасывает
+        закешированный список покупок пользователя. Без delta счетчик
+        пересчитывается по таблице избранного: массовые запросы
+        решают, что менять, по чтению до записи, и при одновременных
+        запросах сдвиг на +-1 расходился бы с числом записей."""
+        if not recipe_ids:
+            return
+        if relate_model is Favorite:
+            Recipe.objects.filter(pk__in=recipe_ids).update(
+                favorites_count=Greatest(F('favorites_count') + delta, 0)
+                if delta is not None
+                else count_subquery(Favorite, 'recipe')
+            )
+        if relate_model is ShoppingCart:
+            bump_version(ShoppingCart, self.request.user.pk)
@@ -0,0 +1,168 @@
+import base64
+import binascii
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Кратно 4, чтобы куски base64 декодировались независимо.
+DECODE_CHUNK_SIZE = 64 * 1024
+THUMBNAILS_DIR = 'core/images/thumbnails'
+
+
+class ImageProcessingError(ValueError):
+    pass
+
+
+def decode_base64(data):
+    """Декодирует base64 частями во временный файл, который
+    остается в памяти только до IMAGE_SPOOL_MAX_SIZE байт."""
+    file = SpooledTemporaryFile(max_size=settings.IMAGE_SPOOL_MAX_SIZE)
+    try:
+        for start in range(0, len(data), DECODE_CHUNK_SIZE):
+            file.write(base64.b64decode(
+                data[start:start + DECODE_CHUNK_SIZE], validate=True
+            ))
+    except binascii.Error:
+        file.close()
+        raise ImageProcessingError('Некорректная строка base64.')
+    file.seek(0)
+    return file
+
+
+def verify_image(file):
+    """Проверяет изображение по заголовку и структуре файла
+    (Image.verify), не декодируя пиксели."""
+    try:
+        with Image.open(file) as image:
+            image.verify()
+            width, height = image.size
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ImageProcessingError('Загрузите корректное изображение.')
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ImageProcessingError('Изображение слишком большое.')
+    file.seek(0)
+
+
+def compress_image(file):
+    """Сохраняет оригинал в WebP, уменьшая его до IMAGE_MAX_SIZE."""
+    output = SpooledTemporaryFile(max_size=settings.IMAGE_SPOOL_MAX_SIZE)
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(settings.IMAGE_MAX_SIZE)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands()
+                                  else 'RGB')
+        image.save(output, 'WEBP', quality=settings.IMAGE_QUALITY)
+    output.seek(0)
+    return File(output, name=f'{uuid.uuid4().hex}.webp')
+
+
+def process_base64_image(data):
+    """Загрузка изображения из base64: декодирование, проверка
+    и сжатие. Возвращает файл для ImageField модели."""
+    with decode_base64(data) as file:
+        verify_image(file)
+        return compress_image(file)
+
+
+def get_thumbnail_name(name, size):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{THUMBNAILS_DIR}/{size}/{stem}.webp'
+
+
+def get_thumbnail_url(recipe, size):
+    """Адрес миниатюры, пока она не создана для текущего
+    изображения рецепта - адрес оригинала. Готовность берется
+    из Recipe.thumbnails_image, без обращений к хранилищу."""
+    name = recipe.image.name
+    if recipe.thumbnails_image == name:
+        return default_storage.url(get_thumbnail_name(name, size))
+    return default_storage.url(name)
+
+
+def delete_thumbnails(name):
+    for size in settings.IMAGE_THUMBNAIL_SIZES:
+        default_storage.delete(get_thumbnail_name(name, size))
+
+
+def make_thumbnails(name):
+    """Создает миниатюры всех размеров из IMAGE_THUMBNAIL_SIZES,
+    отмечает их готовность у рецептов с этим изображением
+    и удаляет миниатюры замененных изображений."""
+    try:
+        with default_storage.open(name) as file, Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            for size, dimensions in settings.IMAGE_THUMBNAIL_SIZES.items():
+                output = SpooledTemporaryFile(
+                    max_size=settings.IMAGE_SPOOL_MAX_SIZE
+                )
+                ImageOps.fit(image, dimensions).save(
+                    output, 'WEBP', quality=settings.IMAGE_QUALITY
+                )
+                output.seek(0)
+                thumbnail = get_thumbnail_name(name, size)
+                default_storage.delete(thumbnail)
+                default_storage.save(thumbnail, File(output))
+        recipes = Recipe.objects.filter(image=name)
+        replaced = set(recipes.exclude(
+            thumbnails_image__in=['', name]
+        ).values_list('thumbnails_image', flat=True))
+        recipes.update(thumbnails_image=name)
+        for old_name in replaced:
+            delete_thumbnails(old_name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+
+
+class LocalBackend:
+    """Выполняет задачу сразу в текущем потоке, для тестов."""
+
+    def submit(self, func, *args):
+        func(*args)
+
+
+class ThreadPoolBackend:
+    """Выполняет задачи в пуле потоков процесса."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='images'
+        )
+
+    def submit(self, func, *args):
+        self.executor.submit(self.run, func, *args)
+
+    @staticmethod
+    def run(func, *args):
+        """Соединения с БД в потоках пула живут между задачами,
+        поэтому устаревшие и сломанные закрываются, как в запросах."""
+        close_old_connections()
+        try:
+            func(*args)
+        finally:
+            close_old_connections()
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.IMAGE_PIPELINE_BACKEND)()
+
+
+def schedule_thumbnails(name):
+    """Ставит создание миниатюр в очередь после фиксации транзакции."""
+    transaction.on_commit(lambda: get_backend().submit(make_thumbnails, name))
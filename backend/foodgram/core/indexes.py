@@ -0,0 +1,20 @@
+from django.contrib.postgres.indexes import OpClass
+from django.db import models
+
+
+class PatternOpsIndex(models.Index):
+    """Функциональный индекс для поиска по префиксу (LIKE 'abc%').
+    На PostgreSQL выражения индексируются с классом операторов
+    varchar_pattern_ops, без него LIKE не использует btree-индекс
+    при локали базы, отличной от C. На остальных СУБД
+    создается обычный индекс по выражению."""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            index = models.Index(
+                *(OpClass(expression, name='varchar_pattern_ops')
+                  for expression in self.expressions),
+                name=self.name
+            )
+            return index.create_sql(model, schema_editor, using, **kwargs)
+        return super().create_sql(model, schema_editor, using, **kwargs)
@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from core.models import Ingredient
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+
+BACKENDS = (
+    'api.filters.IngredientAutocompleteFilter',
+    'api.filters.IngredientMemorySearchFilter',
+)
+SAMPLE_SIZE = 100
+
+
+def get_terms(names, sample_size):
+    """Запросы из названий каталога: начала длиной 1, 2, 3 и 5 символов
+    и подстроки из середины длиной 2 и 4 символа."""
+    step = max(len(names) // sample_size, 1)
+    terms = []
+    for name in names[::step][:sample_size]:
+        terms += [name[:size] for size in (1, 2, 3, 5)]
+        middle = len(name) // 2
+        terms += [name[middle:middle + size] for size in (2, 4)]
+    return [term for term in terms if term.strip()]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает фильтры поиска ингредиентов (INGREDIENT_SEARCH_FILTER)'
+            ' на запросах из каталога: время и число запросов к БД')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=BACKENDS)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.order_by('pk').values_list(
+            'search_name', flat=True
+        ))
+        if not names:
+            raise CommandError('Каталог ингредиентов пуст, см. load_data.')
+        terms = get_terms(names, options['sample_size'])
+        self.stdout.write(
+            f'{len(names)} ингредиентов, {len(terms)} запросов, '
+            f'повторов: {options["repeat"]}, '
+            f'лимит: {settings.INGREDIENT_AUTOCOMPLETE_LIMIT}.'
+        )
+        first, *others = [
+            (path, self.run(import_string(path)(), terms, options['repeat']))
+            for path in options['backends']
+        ]
+        for path, results in others:
+            mismatches = sum(
+                result != expected
+                for result, expected in zip(results, first[1])
+            )
+            self.stdout.write(
+                f'Расхождений с {first[0]}: {mismatches} ({path}).'
+            )
+
+    def run(self, backend, terms, repeat):
+        queryset = Ingredient.objects.all()
+        # Первый вызов строит индекс в памяти, в замеры не входит.
+        backend.search(queryset, terms[0])
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(repeat):
+                for term in terms:
+                    start = time.perf_counter()
+                    list(backend.search(queryset, term))
+                    timings.append(time.perf_counter() - start)
+        timings.sort()
+        self.stdout.write(
+            f'{type(backend).__name__}: '
+            f'среднее {statistics.mean(timings) * 1e6:.0f} мкс, '
+            f'медиана {statistics.median(timings) * 1e6:.0f} мкс, '
+            f'p95 {timings[int(len(timings) * 0.95)] * 1e6:.0f} мкс, '
+            f'запросов к БД: {len(queries) / len(timings):.1f} на поиск.'
+        )
+        return [
+            [ingredient.pk for ingredient in backend.search(queryset, term)]
+            for term in terms
+        ]
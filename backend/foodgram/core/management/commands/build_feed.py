@@ -0,0 +1,41 @@
+import logging
+import time
+
+from core.feed import backfill
+from core.models import Follow
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+sh = logging.StreamHandler()
+sh.setLevel(logging.INFO)
+logger.addHandler(sh)
+
+LOG_EVERY = 100
+
+
+class Command(BaseCommand):
+    help = ('Заполняет ленты подписок по существующим подпискам, '
+            'уже добавленные записи пропускаются')
+
+    def handle(self, *args, **options):
+        processed = 0
+        start = time.monotonic()
+        follows = Follow.objects.order_by('pk').values_list(
+            'user_id', 'author_id'
+        )
+        try:
+            for user_id, author_id in follows.iterator():
+                with transaction.atomic():
+                    backfill(user_id, author_id)
+                processed += 1
+                if processed % LOG_EVERY == 0:
+                    logger.info(
+                        f'Обработано {processed} подписок, '
+                        f'{processed / (time.monotonic() - start):.0f} '
+                        'подписок/с.'
+                    )
+        except DatabaseError as er:
+            raise CommandError(f'Ошибка: {er}')
+        logger.info(f'Успех, обработано {processed} подписок.')
@@ -1,10 +1,14 @@
 import csv
+import json
 import logging
 import os
+import time
+from itertools import islice
 
+from core.cache import bump_version
 from core.models import Ingredient
-from django.core.management.base import BaseCommand
-from django.db import DatabaseError, IntegrityError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
 from foodgram.settings import BASE_DIR
 
 logger = logging.getLogger(__name__)
@@ -18,46 +22,99 @@ FILE = os.path.join(
     BASE_DIR,
     'data/ingredients.csv'
 )
+BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
 
 
-def open_csv(file):
-    try:
-        with open(FILE, 'r',
-                  encoding='utf-8') as r_file:
-            reader = csv.DictReader(
-                r_file,
-                fieldnames=[
-                    'name',
-                    'measurement_unit'
-                ],
-                delimiter=',')
-            create_obj(reader)
-    except FileNotFoundError:
-        logger.error(f'Файл не найден. {FILE}')
-
-
-def create_obj(reader):
-    try:
-        objects = [Ingredient(
-            name=i['name'],
-            measurement_unit=i['measurement_unit']
-        ) for i in reader]
-        Ingredient.objects.bulk_create(objects)
-    except IntegrityError:
-        logger.error('Ошибка уникальности')
-    except DatabaseError as er:
-        logger.error(f'Ошибка: {er}')
-    else:
-        logger.info(f'Успех, добавлено '
-                    f'{reader.line_num} записей.')
+def read_csv(file):
+    """Строки CSV вида: название,единица измерения."""
+    reader = csv.DictReader(
+        file,
+        fieldnames=[
+            'name',
+            'measurement_unit'
+        ],
+        delimiter=',')
+    yield from reader
+
+
+def read_json(file):
+    """Объекты из JSON-массива, читаются из файла частями."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n[,':
+                position += 1
+            try:
+                obj, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield obj
+        buffer = buffer[position:]
+    if buffer.strip() not in ('', ']'):
+        raise CommandError('Некорректный JSON в конце файла.')
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def read_ingredients(path):
+    """Генератор ингредиентов из CSV или JSON файла."""
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise CommandError(f'Неподдерживаемый формат файла: {path}')
+    with open(path, 'r', encoding='utf-8') as file:
+        for row in reader(file):
+            name = row['name'].strip()
+            yield Ingredient(
+                name=name,
+                measurement_unit=row['measurement_unit'].strip(),
+                search_name=name.casefold()
+            )
+
+
+def load(ingredients, batch_size):
+    """Вставляет ингредиенты пачками, каждая пачка в своей транзакции.
+    Существующие пары (название, единица измерения) пропускаются,
+    поэтому повторная загрузка ничего не меняет."""
+    processed = 0
+    start = time.monotonic()
+    while batch := list(islice(ingredients, batch_size)):
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        processed += len(batch)
+        logger.info(f'Обработано {processed} строк, '
+                    f'{processed / (time.monotonic() - start):.0f} строк/с.')
+    return processed
 
 
 class Command(BaseCommand):
-    help = f'Загружает данные из csv таблицы {FILE}'
+    help = ('Загружает ингредиенты из CSV или JSON файла '
+            f'(по умолчанию {FILE})')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=FILE)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
 
     def handle(self, *args, **options):
+        path = options['path']
+        before = Ingredient.objects.count()
         try:
-            open_csv(FILE)
-        except TypeError:
-            logger.error(f'Ошибка, проверьте '
-                         f'наличие файла по адресу {FILE}')
+            processed = load(read_ingredients(path), options['batch_size'])
+        except FileNotFoundError:
+            raise CommandError(f'Файл не найден. {path}')
+        except (KeyError, TypeError, AttributeError):
+            raise CommandError(f'Ошибка, проверьте формат файла {path}')
+        except DatabaseError as er:
+            raise CommandError(f'Ошибка: {er}')
+        finally:
+            bump_version(Ingredient)
+        added = Ingredient.objects.count() - before
+        logger.info(f'Успех, обработано {processed} строк, '
+                    f'добавлено {added} записей.')
@@ -0,0 +1,75 @@
+import logging
+import time
+
+from core.cache import bump_version
+from core.helpers import count_subquery
+from core.models import Favorite, Recipe
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+sh = logging.StreamHandler()
+sh.setLevel(logging.INFO)
+logger.addHandler(sh)
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+def recount(model, counter, value, batch_size):
+    """Пересчитывает счетчик пачками по диапазонам первичного ключа,
+    каждая пачка в своей транзакции."""
+    processed = 0
+    start = time.monotonic()
+    last_pk = 0
+    while True:
+        pks = list(
+            model.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+        with transaction.atomic():
+            model.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(
+                **{counter: value}
+            )
+        last_pk = pks[-1]
+        processed += len(pks)
+        logger.info(f'{model._meta.verbose_name_plural}: '
+                    f'обработано {processed} записей, '
+                    f'{processed / (time.monotonic() - start):.0f} записей/с.')
+    return processed
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики добавлений в избранное '
+            'и количества рецептов авторов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        try:
+            recipes = recount(
+                Recipe,
+                'favorites_count',
+                count_subquery(Favorite, 'recipe'),
+                batch_size
+            )
+            users = recount(
+                User,
+                'recipes_count',
+                count_subquery(Recipe, 'author'),
+                batch_size
+            )
+        except DatabaseError as er:
+            raise CommandError(f'Ошибка: {er}')
+        finally:
+            bump_version(Recipe)
+        logger.info(f'Успех, пересчитано {recipes} рецептов '
+                    f'и {users} пользователей.')
@@ -2,9 +2,12 @@ from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F
 from django.db.models.constraints import UniqueConstraint
 from foodgram import settings
 
+from .indexes import PatternOpsIndex
+
 User = get_user_model()
 
 
@@ -38,14 +41,33 @@ class Ingredient(models.Model):
         'единица измерения',
         max_length=settings.MAX_LENGTH
     )
+    # LOWER() в SQLite меняет регистр только латиницы, поэтому название
+    # для поиска приводится к нижнему регистру в Python (casefold).
+    search_name = models.CharField(
+        'Название для поиска',
+        max_length=settings.MAX_LENGTH,
+        blank=True, default='', editable=False
+    )
 
     class Meta:
         verbose_name = 'ингредиент',
         verbose_name_plural = 'ингредиенты'
+        indexes = [
+            PatternOpsIndex(F('search_name'),
+                            name='ingredient_search_name_idx')
+        ]
+        constraints = [
+            UniqueConstraint(fields=['name', 'measurement_unit'],
+                             name='unique_ingredient_unit')
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = self.name.casefold()
+        super().save(*args, **kwargs)
+
 
 class Recipe(models.Model):
     tags = models.ManyToManyField(
@@ -80,11 +102,29 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         verbose_name='Дата создания',
         auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0, editable=False
+    )
+    search_document = models.TextField(
+        'Поисковый документ',
+        blank=True, default='', editable=False
+    )
+    thumbnails_image = models.CharField(
+        'Изображение с готовыми миниатюрами',
+        max_length=100, blank=True, default='', editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date', ]
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_feed_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_feed_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -94,8 +134,10 @@ class Recipe(models.Model):
 
 
 class RecipeIngredient(models.Model):
+    # Индекс по recipe_id покрывает ограничение unique_ingredient.
     recipe = models.ForeignKey(
-        Recipe, on_delete=models.CASCADE
+        Recipe, on_delete=models.CASCADE,
+        db_index=False
     )
     ingredient = models.ForeignKey(
         Ingredient, on_delete=models.CASCADE,
@@ -107,17 +149,22 @@ class RecipeIngredient(models.Model):
     )
 
     class Meta:
-        UniqueConstraint(fields=['recipe', 'ingredient'],
-                         name='unique_ingredient')
+        constraints = [
+            UniqueConstraint(fields=['recipe', 'ingredient'],
+                             name='unique_ingredient')
+        ]
 
     def __str__(self):
         return str(self.amount)
 
 
 class Favorite(models.Model):
+    # Индексы по user_id здесь и в Follow, ShoppingCart покрываются
+    # ограничениями уникальности, где user - первое поле.
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
-        related_name='favorite'
+        related_name='favorite',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE,
@@ -134,7 +181,8 @@ class Favorite(models.Model):
 class Follow(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
-        related_name='follower'
+        related_name='follower',
+        db_index=False
     )
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
@@ -152,7 +200,8 @@ class Follow(models.Model):
 class ShoppingCart(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
-        related_name='cart'
+        related_name='cart',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE,
@@ -164,3 +213,39 @@ class ShoppingCart(models.Model):
             UniqueConstraint(fields=['user', 'recipe'],
                              name='unique_cart')
         ]
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя. Заполняется при публикации
+    рецепта и при подписке, см. core.feed."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='feed',
+        db_index=False
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    # Записи удаляются вместе с рецептами автора, поэтому отдельный
+    # индекс по author_id для каскадного удаления не нужен.
+    author = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING,
+        related_name='+',
+        db_index=False
+    )
+    pub_date = models.DateTimeField('Дата создания рецепта')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+        constraints = [
+            UniqueConstraint(fields=['user', 'recipe'],
+                             name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-id'],
+                         name='feed_entry_user_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_entry_author_idx'),
+        ]
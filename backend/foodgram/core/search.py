@@ -0,0 +1,275 @@
+import re
+import sys
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .cache import get_version
+from .models import Ingredient, Recipe, RecipeIngredient
+
+SEARCH_DOCUMENT_BATCH_SIZE = 500
+
+
+class IngredientIndex:
+    """Поисковый индекс ингредиентов в памяти процесса.
+
+    Названия в нижнем регистре (casefold) хранятся отсортированным
+    массивом: совпадения по началу находятся бинарным поиском,
+    совпадения по подстроке - через индекс n-грамм.
+    Индекс строится при первом обращении и перестраивается
+    при смене версии ингредиентов в кеше (см. core.cache)."""
+
+    ngram_size = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = None
+
+    def get_snapshot(self):
+        version = get_version(Ingredient)
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._snapshot = self.build()
+                    self._version = version
+        return self._snapshot
+
+    def build(self):
+        ingredients = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (ingredient.name.casefold(),
+                                    ingredient.pk)
+        )
+        keys = [ingredient.name.casefold() for ingredient in ingredients]
+        ngrams = defaultdict(set)
+        for position, key in enumerate(keys):
+            for ngram in self.get_ngrams(key):
+                ngrams[ngram].add(position)
+        return keys, ingredients, dict(ngrams)
+
+    def get_ngrams(self, value):
+        size = self.ngram_size
+        return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+    def find_prefix(self, keys, term):
+        start = bisect_left(keys, term)
+        end = bisect_left(keys, term + chr(sys.maxunicode), lo=start)
+        return range(start, end)
+
+    def find_substring(self, keys, ngrams, term):
+        if len(term) < self.ngram_size:
+            candidates = range(len(keys))
+        else:
+            candidates = sorted(set.intersection(*(
+                ngrams.get(ngram, set()) for ngram in self.get_ngrams(term)
+            )))
+        return [position for position in candidates
+                if term in keys[position]]
+
+    def search(self, term, limit):
+        """Ингредиенты, начинающиеся с term, затем содержащие term."""
+        keys, ingredients, ngrams = self.get_snapshot()
+        term = term.casefold()
+        prefix = self.find_prefix(keys, term)
+        positions = list(prefix[:limit])
+        if len(positions) < limit:
+            positions += [
+                position
+                for position in self.find_substring(keys, ngrams, term)
+                if position not in prefix
+            ][:limit - len(positions)]
+        return [ingredients[position] for position in positions]
+
+
+ingredient_index = IngredientIndex()
+
+
+def update_search_documents(recipe_ids):
+    """Пересобирает поисковые документы рецептов: название,
+    описание и названия ингредиентов."""
+    names = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('id').values_list('recipe_id', 'ingredient__name'):
+        names[recipe_id].append(name)
+    recipes = [
+        Recipe(pk=pk, search_document=' '.join([name, text, *names[pk]]))
+        for pk, name, text in Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('pk', 'name', 'text')
+    ]
+    Recipe.objects.bulk_update(recipes, ['search_document'])
+
+
+def refresh_search_documents(queryset):
+    """Пересобирает документы рецептов из queryset пачками."""
+    recipe_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(recipe_ids), SEARCH_DOCUMENT_BATCH_SIZE):
+        update_search_documents(
+            recipe_ids[start:start + SEARCH_DOCUMENT_BATCH_SIZE]
+        )
+
+
+class RecipeSearch:
+    """Поиск по Recipe.search_document без полнотекстового индекса,
+    для СУБД, для которых нет своего класса в RECIPE_SEARCH_BACKENDS."""
+
+    def install(self, connection):
+        """Создает индекс поиска, вызывается после migrate."""
+
+    def search(self, queryset, term):
+        return queryset.filter(search_document__icontains=term)
+
+
+class PostgresRecipeSearch(RecipeSearch):
+    """tsvector по поисковому документу с GIN-индексом
+    по тому же выражению, сортировка по ts_rank."""
+
+    index_name = 'recipe_search_idx'
+
+    def get_vector(self):
+        from django.contrib.postgres.search import SearchVector
+        return SearchVector('search_document',
+                            config=settings.RECIPE_SEARCH_CONFIG)
+
+    def install(self, connection):
+        from django.contrib.postgres.indexes import GinIndex
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Recipe._meta.db_table
+            )
+        if self.index_name in constraints:
+            return
+        with connection.schema_editor() as schema_editor:
+            schema_editor.add_index(
+                Recipe, GinIndex(self.get_vector(), name=self.index_name)
+            )
+
+    def search(self, queryset, term):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        query = SearchQuery(term, config=settings.RECIPE_SEARCH_CONFIG,
+                            search_type='websearch')
+        vector = self.get_vector()
+        return queryset.alias(search_vector=vector).filter(
+            search_vector=query
+        ).annotate(
+            search_rank=SearchRank(vector, query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+
+
+class SQLiteRecipeSearch(RecipeSearch):
+    """Виртуальная таблица FTS5 с внешним содержимым (core_recipe),
+    синхронизируется триггерами, сортировка по bm25."""
+
+    table = 'core_recipe_search'
+
+    def get_trigger_names(self):
+        return [f'{self.table}_{event}'
+                for event in ('insert', 'delete', 'update')]
+
+    def get_install_sql(self):
+        table, recipes = self.table, Recipe._meta.db_table
+        insert, delete, update = self.get_trigger_names()
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"search_document, content='{recipes}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER IF NOT EXISTS {insert} "
+            f"AFTER INSERT ON {recipes} BEGIN "
+            f"INSERT INTO {table}(rowid, search_document) "
+            f"VALUES (new.id, new.search_document); END",
+            f"CREATE TRIGGER IF NOT EXISTS {delete} "
+            f"AFTER DELETE ON {recipes} BEGIN "
+            f"INSERT INTO {table}({table}, rowid, search_document) "
+            f"VALUES ('delete', old.id, old.search_document); END",
+            f"CREATE TRIGGER IF NOT EXISTS {update} "
+            f"AFTER UPDATE OF search_document ON {recipes} BEGIN "
+            f"INSERT INTO {table}({table}, rowid, search_document) "
+            f"VALUES ('delete', old.id, old.search_document); "
+            f"INSERT INTO {table}(rowid, search_document) "
+            f"VALUES (new.id, new.search_document); END",
+            f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+        ]
+
+    def install(self, connection):
+        """Триггеры проверяются вместе с таблицей: миграции, которые
+        пересоздают core_recipe (например, AddField со значением
+        по умолчанию), удаляют их. Недостающее создается заново,
+        а индекс перестраивается по текущему содержимому."""
+        names = [self.table, *self.get_trigger_names()]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM sqlite_master WHERE name IN (%s)'
+                % ', '.join(['%s'] * len(names)), names
+            )
+            if cursor.fetchone()[0] == len(names):
+                return
+            for sql in self.get_install_sql():
+                cursor.execute(sql)
+
+    def get_match_query(self, term):
+        """Каждое слово запроса в кавычках и с поиском по началу,
+        чтобы синтаксис FTS5 во вводе пользователя не применялся."""
+        return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', term))
+
+    def search(self, queryset, term):
+        match = self.get_match_query(term)
+        if not match:
+            return queryset.none()
+        table, recipes = self.table, Recipe._meta.db_table
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s', (match,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT rank FROM {table} WHERE {table} MATCH %s '
+            f'AND rowid = "{recipes}"."id"', (match,)
+        )).order_by('search_rank', '-pub_date', '-id')
+
+
+@lru_cache(maxsize=None)
+def get_recipe_search(vendor):
+    backend = settings.RECIPE_SEARCH_BACKENDS.get(vendor)
+    return import_string(backend)() if backend else RecipeSearch()
+
+
+def search_recipes(queryset, term):
+    """Рецепты, найденные по term, от более релевантных к менее."""
+    return get_recipe_search(
+        connections[queryset.db].vendor
+    ).search(queryset, term)
+
+
+def install_recipe_search(using, **kwargs):
+    """Обработчик post_migrate: создает индекс поиска
+    и заполняет пустые поисковые документы."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    if Recipe._meta.db_table not in tables:
+        return
+    get_recipe_search(connection.vendor).install(connection)
+    refresh_search_documents(
+        Recipe.objects.filter(search_document='')
+    )
+
+
+def fill_ingredient_search_names(using, **kwargs):
+    """Обработчик post_migrate: заполняет Ingredient.search_name
+    у записей, созданных до появления поля."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    if Ingredient._meta.db_table not in tables:
+        return
+    ingredients = list(Ingredient.objects.filter(search_name=''))
+    for ingredient in ingredients:
+        ingredient.search_name = ingredient.name.casefold()
+    Ingredient.objects.bulk_update(
+        ingredients, ['search_name'], batch_size=SEARCH_DOCUMENT_BATCH_SIZE
+    )
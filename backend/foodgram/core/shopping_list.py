@@ -0,0 +1,140 @@
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Subquery, Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .cache import get_timeout, get_version
+from .models import Recipe, ShoppingCart
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_cache_key(user):
+    return (f'shopping_list:{user.pk}:'
+            f'{get_version(ShoppingCart, user.pk)}:{get_version(Recipe)}')
+
+
+def calculate_shopping_list(user):
+    """Суммы ингредиентов и общее время приготовления
+    для корзины пользователя одним запросом. Запрос идет от корзины,
+    поэтому рецепты без ингредиентов тоже учитываются во времени:
+    они дают строку с пустым ингредиентом. Пустая корзина - None."""
+    total_time = ShoppingCart.objects.filter(user=user).values(
+        'user'
+    ).annotate(total=Sum('recipe__cooking_time')).values('total')
+    ingredient = 'recipe__recipeingredient__ingredient__'
+    ingredients = ShoppingCart.objects.filter(user=user).values(
+        f'{ingredient}name', f'{ingredient}measurement_unit'
+    ).annotate(
+        total_amount=Sum('recipe__recipeingredient__amount'),
+        total_time=Subquery(total_time)
+    ).order_by(f'{ingredient}name')
+    rows, minutes = [], None
+    for row in ingredients.iterator():
+        minutes = row['total_time']
+        if row[f'{ingredient}name'] is not None:
+            rows.append((row[f'{ingredient}name'],
+                         row['total_amount'],
+                         row[f'{ingredient}measurement_unit']))
+    if minutes is None:
+        return None
+    return {'rows': rows, 'total_time': divmod(minutes, 60)}
+
+
+def get_shopping_list(user):
+    """Список покупок из кеша, пересчитывается при изменении
+    корзины пользователя или рецептов. Пустая корзина - None."""
+    key = get_cache_key(user)
+    shopping_list = cache.get(key)
+    if shopping_list is None:
+        shopping_list = calculate_shopping_list(user)
+        if shopping_list is None:
+            return None
+        cache.set(key, shopping_list, get_timeout(cache.default_timeout))
+    return shopping_list
+
+
+def get_title(user):
+    return (f'Список покупок для пользователя '
+            f'{user.first_name} {user.last_name}')
+
+
+def get_footer(shopping_list):
+    hours, minutes = shopping_list['total_time']
+    return (f'Общее время приготовления составит: '
+            f'{hours}ч. {minutes}мин.')
+
+
+def export_txt(user, shopping_list):
+    """Список покупок в текстовом виде, построчно."""
+    yield get_title(user) + '\n'
+    for name, amount, unit in shopping_list['rows']:
+        yield f'\n☐ {name} - {amount} - {unit}'
+    yield '\n\n' + get_footer(shopping_list)
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(user, shopping_list):
+    """Список покупок в формате CSV, построчно."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['Ингредиент', 'Количество', 'Единица измерения'])
+    for row in shopping_list['rows']:
+        yield writer.writerow(row)
+
+
+def get_pdf_font():
+    """Шрифт с кириллицей из настроек, иначе встроенный Helvetica."""
+    path = settings.SHOPPING_LIST_PDF_FONT
+    if not path or not os.path.exists(path):
+        return 'Helvetica'
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(name, path))
+    return name
+
+
+def export_pdf(user, shopping_list):
+    """Список покупок в PDF. Документ пишется постранично
+    во временный файл и отдается частями."""
+    font = get_pdf_font()
+    width, height = A4
+    margin, line_height = 50, 18
+    with SpooledTemporaryFile(max_size=CHUNK_SIZE) as file:
+        pdf = canvas.Canvas(file, pagesize=A4)
+        pdf.setFont(font, 14)
+        pdf.drawString(margin, height - margin, get_title(user))
+        pdf.setFont(font, 11)
+        y = height - margin - 2 * line_height
+        for name, amount, unit in shopping_list['rows']:
+            if y < margin:
+                pdf.showPage()
+                pdf.setFont(font, 11)
+                y = height - margin
+            pdf.drawString(margin, y, f'☐ {name} - {amount} - {unit}')
+            y -= line_height
+        pdf.drawString(margin, max(y - line_height, margin),
+                       get_footer(shopping_list))
+        pdf.save()
+        file.seek(0)
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+
+
+EXPORTS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'pdf': export_pdf,
+}
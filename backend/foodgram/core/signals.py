@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import feed
+from .cache import bump_version
+from .images import schedule_thumbnails
+from .models import Follow, Ingredient, Recipe, Tag
+from .search import refresh_search_documents
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Recipe)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+def create_thumbnails(instance, update_fields=None, **kwargs):
+    if instance.image and (update_fields is None
+                           or 'image' in update_fields):
+        schedule_thumbnails(instance.image.name)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_documents(instance, created, **kwargs):
+    if not created:
+        refresh_search_documents(
+            Recipe.objects.filter(recipeingredient__ingredient=instance)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=Greatest(F('recipes_count') - 1, 0)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(instance, **kwargs):
+    feed.trim(instance.user_id, instance.author_id)
@@ -0,0 +1,293 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from api.filters import IngredientAutocompleteFilter
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .cache import get_timeout, get_version
+from .management.commands import recount
+from .models import (Favorite, FeedEntry, Follow, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from .search import (IngredientIndex, SQLiteRecipeSearch,
+                     install_recipe_search, search_recipes)
+
+User = get_user_model()
+
+
+class IndexUsageTest(TestCase):
+    """Частые запросы читают таблицы по индексам, а не полным
+    просмотром (EXPLAIN на SQLite и PostgreSQL)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='Pass12345!'
+        )
+
+    def get_plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик выбирает полный просмотр.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assert_uses_index(self, queryset, index=None):
+        plan = self.get_plan(queryset)
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'postgresql':
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+        else:
+            self.assertNotRegex(plan, rf'SCAN {table}(?! USING)')
+        self.assertIn('index', plan.lower())
+        if index is not None:
+            self.assertIn(index, plan)
+
+    def test_recipe_feed(self):
+        self.assert_uses_index(
+            Recipe.objects.order_by('-pub_date', '-id')[:6],
+            'recipe_feed_idx'
+        )
+
+    def test_author_recipes(self):
+        self.assert_uses_index(
+            Recipe.objects.filter(author=self.user).order_by('-pub_date'),
+            'recipe_author_feed_idx'
+        )
+
+    def test_user_recipe_relations(self):
+        for model in (Favorite, ShoppingCart):
+            with self.subTest(model=model.__name__):
+                self.assert_uses_index(
+                    model.objects.filter(user=self.user, recipe_id=1)
+                )
+
+    def test_follow(self):
+        self.assert_uses_index(
+            Follow.objects.filter(user=self.user, author_id=1)
+        )
+
+    def test_recipe_ingredients(self):
+        self.assert_uses_index(
+            RecipeIngredient.objects.filter(recipe_id=1)
+        )
+
+    def test_ingredient_unique(self):
+        self.assert_uses_index(
+            Ingredient.objects.filter(name='Соль', measurement_unit='г')
+        )
+
+    def test_ingredient_prefix(self):
+        prefix, _ = IngredientAutocompleteFilter().get_querysets(
+            Ingredient.objects.all(), 'со'
+        )
+        self.assert_uses_index(prefix, 'ingredient_search_name_idx')
+
+    def test_feed_entries(self):
+        self.assert_uses_index(
+            FeedEntry.objects.filter(user=self.user).order_by(
+                '-pub_date', '-id'
+            )[:6],
+            'feed_entry_user_idx'
+        )
+
+
+class CountersTest(TestCase):
+    """Денормализованные счетчики рецептов автора и добавлений
+    в избранное, пересчет командой recount."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='Pass12345!'
+        )
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='Pass12345!'
+        )
+
+    def create_recipe(self):
+        return Recipe.objects.create(author=self.author, name='Рецепт',
+                                     text='Текст', cooking_time=10)
+
+    def test_recipes_count(self):
+        recipes = [self.create_recipe() for _ in range(3)]
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 3)
+        recipes[0].delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_recount(self):
+        recipes = [self.create_recipe() for _ in range(3)]
+        for user in (self.author, self.user):
+            Favorite.objects.create(user=user, recipe=recipes[0])
+        Favorite.objects.create(user=self.user, recipe=recipes[1])
+        Recipe.objects.update(favorites_count=7)
+        User.objects.update(recipes_count=7)
+        with self.assertLogs('core.management.commands.recount', 'INFO'):
+            call_command(recount.Command(), batch_size=2)
+        self.assertEqual(
+            list(Recipe.objects.order_by('pk').values_list(
+                'favorites_count', flat=True
+            )),
+            [2, 1, 0]
+        )
+        self.author.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.author.recipes_count, self.user.recipes_count), (3, 0)
+        )
+
+
+class SQLiteRecipeSearchTest(TestCase):
+    """Индекс FTS5 восстанавливается после миграций,
+    пересоздающих таблицу рецептов вместе с триггерами."""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 используется только на SQLite')
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='Pass12345!'
+        )
+
+    def get_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def test_reinstall_dropped_triggers(self):
+        triggers = SQLiteRecipeSearch().get_trigger_names()
+        with connection.cursor() as cursor:
+            for name in triggers:
+                cursor.execute(f'DROP TRIGGER {name}')
+        install_recipe_search('default')
+        self.assertLessEqual(set(triggers), self.get_triggers())
+        recipe = Recipe.objects.create(
+            author=self.author, name='Борщ', text='Текст', cooking_time=10,
+            search_document='Борщ Текст Свекла'
+        )
+        self.assertEqual(
+            list(search_recipes(Recipe.objects.all(), 'свекла')), [recipe]
+        )
+
+
+@override_settings(LOCAL_CACHE_TIMEOUT=30)
+class CacheTimeoutTest(SimpleTestCase):
+    """С кешем в памяти процесса записи, зависящие от версий,
+    живут не дольше LOCAL_CACHE_TIMEOUT, с общим кешем - как заданы."""
+
+    def test_local_cache(self):
+        with self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }}):
+            self.assertEqual(get_timeout(), 30)
+            self.assertEqual(get_timeout(300), 30)
+            self.assertEqual(get_timeout(10), 10)
+
+    def test_shared_cache(self):
+        with self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }}):
+            self.assertIsNone(get_timeout())
+            self.assertEqual(get_timeout(300), 300)
+
+    def test_versions_do_not_expire(self):
+        # Иначе без изменений данных менялись бы ключи кеша и ETag.
+        version = get_version(Tag)
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=time.time() + 3600):
+            self.assertEqual(get_version(Tag), version)
+
+
+@override_settings(INGREDIENT_AUTOCOMPLETE_LIMIT=20)
+class IngredientIndexTest(TestCase):
+    """Индекс ингредиентов в памяти: начало названия бинарным поиском,
+    подстрока по n-граммам или перебором для коротких запросов."""
+
+    NAMES = ('Сахар', 'Сахарная пудра', 'Тростниковый сахар', 'Соль',
+             'Масло сливочное', 'Ваниль', 'Vanilla')
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in cls.NAMES:
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        self.index = IngredientIndex()
+
+    def search(self, term, limit=20):
+        return [ingredient.name for ingredient in self.index.search(term,
+                                                                    limit)]
+
+    def test_prefix(self):
+        keys, _, _ = self.index.build()
+        self.assertEqual(
+            [keys[position]
+             for position in self.index.find_prefix(keys, 'сах')],
+            ['сахар', 'сахарная пудра']
+        )
+        self.assertEqual(list(self.index.find_prefix(keys, 'я')), [])
+
+    def test_ngram_substring(self):
+        # Проверяются только позиции из индекса n-грамм.
+        keys = ['abcd', 'xabc', 'xabd']
+        ngrams = {'abc': {1}, 'xab': {1, 2}}
+        self.assertEqual(self.index.find_substring(keys, ngrams, 'xabc'),
+                         [1])
+        self.assertEqual(self.index.find_substring(keys, ngrams, 'abc'),
+                         [1])
+        self.assertEqual(self.index.find_substring(keys, ngrams, 'zzz'),
+                         [])
+        self.assertEqual(self.search('ливо'), ['Масло сливочное'])
+
+    def test_short_term_substring(self):
+        # Запрос короче n-граммы ищется перебором всех названий.
+        keys = ['abcd', 'xabc', 'xabd']
+        self.assertEqual(self.index.find_substring(keys, {}, 'ab'),
+                         [0, 1, 2])
+        self.assertEqual(self.search('ль'), ['Ваниль', 'Соль'])
+
+    def test_prefix_before_substring(self):
+        self.assertEqual(
+            self.search('сахар'),
+            ['Сахар', 'Сахарная пудра', 'Тростниковый сахар']
+        )
+        self.assertEqual(self.search('с', limit=2),
+                         ['Сахар', 'Сахарная пудра'])
+        self.assertEqual(len(self.search('а', limit=3)), 3)
+
+    def test_case_insensitive(self):
+        self.assertEqual(self.search('САХАР'), self.search('сахар'))
+        self.assertEqual(self.search('VANI'), ['Vanilla'])
+
+    def test_rebuild(self):
+        self.assertEqual(self.search('мёд'), [])
+        with self.assertNumQueries(0):
+            self.search('сахар')
+        Ingredient.objects.create(name='Мёд', measurement_unit='г')
+        self.assertEqual(self.search('мёд'), ['Мёд'])
+
+    def test_same_as_database(self):
+        backend = IngredientAutocompleteFilter()
+        for term in ('с', 'са', 'сах', 'ар', 'ль', 'ливо', 'van', 'нет'):
+            with self.subTest(term=term):
+                self.assertEqual(
+                    self.index.search(term, 20),
+                    backend.search(Ingredient.objects.all(), term)
+                )
+
+    def test_benchmark(self):
+        stdout = StringIO()
+        call_command('benchmark_ingredient_search', repeat=1,
+                     stdout=stdout)
+        self.assertIn('Расхождений с api.filters.IngredientAutocompleteFilter:'
+                      ' 0', stdout.getvalue())
+        Ingredient.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('benchmark_ingredient_search', stdout=stdout)
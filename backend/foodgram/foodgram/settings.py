@@ -83,6 +83,28 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Версии данных (core.cache) должны быть общими для всех процессов.
+# У LocMemCache кеш свой в каждом воркере gunicorn и изменение, сделанное
+# в одном процессе, остальные не видят: с ним закешированные ответы,
+# списки покупок и теги живут не дольше LOCAL_CACHE_TIMEOUT секунд,
+# а индекс ингредиентов (core.search) в других процессах не обновляется.
+# При нескольких воркерах нужен общий кеш:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://redis:6379
+LOCAL_CACHE_TIMEOUT = 30  # Секунд
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -127,10 +149,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
+        'users.authentication.CachedTokenAuthentication'
     ]
 }
 
+# Кеш токенов авторизации (users.authentication). При нескольких воркерах
+# нужен TOKEN_CACHE_ALIAS с общим кешем (например, Redis): по версиям токенов
+# в нем процессы узнают о выходе, смене пароля и блокировке пользователя.
+TOKEN_CACHE_MAX_SIZE = 10000
+TOKEN_CACHE_TIMEOUT = 60  # Секунд
+TOKEN_CACHE_ALIAS = os.getenv('TOKEN_CACHE_ALIAS')  # Общий кеш, например 'default'
+
 DJOSER = {
     'HIDE_USERS': False,
     'SERIALIZERS': {
@@ -147,9 +176,47 @@ DJOSER = {
 
 MAX_LENGTH = 100  # Длина имен
 
+# Шрифт с кириллицей для PDF списка покупок
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+ESTIMATED_COUNT_TIMEOUT = 60  # Секунд кеша для оценки числа записей
+
+BULK_MAX_ITEMS = 100  # Рецептов в одном массовом запросе
+
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20  # Подсказок в поиске ингредиентов
+# Поиск ингредиентов: по индексу в БД или в памяти процесса
+# ('api.filters.IngredientMemorySearchFilter').
+INGREDIENT_SEARCH_FILTER = os.getenv(
+    'INGREDIENT_SEARCH_FILTER', 'api.filters.IngredientAutocompleteFilter'
+)
+
+# Полнотекстовый поиск рецептов: класс для каждой СУБД.
+RECIPE_SEARCH_BACKENDS = {
+    'postgresql': 'core.search.PostgresRecipeSearch',
+    'sqlite': 'core.search.SQLiteRecipeSearch',
+}
+RECIPE_SEARCH_CONFIG = 'russian'  # Конфигурация текстового поиска PostgreSQL
+
 AUTH_USER_MODEL = 'users.CustomUser'
 CSRF_TRUSTED_ORIGINS = [f"{os.getenv('HOST')}", 'http://localhost', 'http://127.0.0.1']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Обработка изображений рецептов (core.images)
+IMAGE_PIPELINE_BACKEND = os.getenv(
+    'IMAGE_PIPELINE_BACKEND', 'core.images.ThreadPoolBackend'
+)
+IMAGE_WORKERS = 2
+IMAGE_SPOOL_MAX_SIZE = 1024 * 1024  # Байт в памяти до записи на диск
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_MAX_SIZE = (1600, 1600)
+IMAGE_QUALITY = 80
+IMAGE_THUMBNAIL_SIZES = {
+    'card': (480, 360),  # карточка в ленте
+    'preview': (160, 160),  # урезанный рецепт в подписках и корзине
+}
+
 HOST = 'localhost'  # для верного отображения get_absolute_url в админке.
@@ -0,0 +1,17 @@
+"""Настройки для тестов, по умолчанию для python manage.py test
+(см. manage.py)."""
+import os
+
+from .settings import *  # noqa: F401, F403
+from .settings import BASE_DIR, DATABASES
+
+# Миграции создаются при развертывании (см. README), поэтому тестовая
+# база создается напрямую по моделям.
+MIGRATION_MODULES = {'users': None, 'core': None, 'api': None}
+
+# Тестовая база SQLite - файл, а не память: параллельные запросы
+# в тестах ждут блокировку, а не получают ошибку.
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    DATABASES['default']['TEST'] = {
+        'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')
+    }
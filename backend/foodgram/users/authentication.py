@@ -0,0 +1,88 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """Кеш токен -> (пользователь, токен) в памяти процесса: LRU
+    с ограниченным размером и временем жизни записей.
+
+    Если задан TOKEN_CACHE_ALIAS, в общем кеше Django хранится только
+    версия каждого токена (не пользователь с хешем пароля). Запись
+    в памяти действительна, пока ее версия совпадает с общей, поэтому
+    выход, смена пароля или блокировка в одном процессе сразу видны
+    остальным. Без общего кеша сброс виден только в своем процессе."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def shared(self):
+        if settings.TOKEN_CACHE_ALIAS:
+            return caches[settings.TOKEN_CACHE_ALIAS]
+        return None
+
+    def get_version_key(self, key):
+        return 'token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get_version(self, key):
+        """Версия токена в общем кеше, None без общего кеша. Берется
+        до чтения пользователя из базы: если токен сбросят во время
+        чтения, сохраненная запись уже не совпадет с новой версией."""
+        if self.shared is None:
+            return None
+        return self.shared.get_or_set(
+            self.get_version_key(key), time.time_ns,
+            settings.TOKEN_CACHE_TIMEOUT
+        )
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, entry_version, value = entry
+            if expires > time.monotonic() and entry_version == version:
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+        return None
+
+    def set(self, key, value, version=None):
+        expires = time.monotonic() + settings.TOKEN_CACHE_TIMEOUT
+        with self._lock:
+            self._entries[key] = (expires, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_MAX_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(self.get_version_key(key))
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый запрос:
+    пара пользователь-токен берется из token_cache. Записи сбрасываются
+    сигналами при выходе (удалении токена) и изменении пользователя."""
+
+    def authenticate_credentials(self, key):
+        version = token_cache.get_version(key)
+        cached = token_cache.get(key, version)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached, version)
+        user, token = cached
+        return copy.copy(user), token
@@ -20,11 +20,30 @@ class CustomUser(AbstractUser):
         blank=False,
         null=False
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'пользователь'
         verbose_name_plural = 'пользователи'
         ordering = ['id']
 
+    def save(self, *args, **kwargs):
+        """recipes_count меняется только запросами UPDATE из сигналов
+        рецептов. Полное сохранение существующего пользователя (смена
+        пароля, профиль, админка) может идти от устаревшего объекта,
+        например из кеша токенов, и не должно перезаписывать счетчик."""
+        if (kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')
+                and not self._state.adding):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'recipes_count'
+            ]
+        super().save(*args, **kwargs)
+
     def has_module_perms(self, app_label):
         return self.is_staff
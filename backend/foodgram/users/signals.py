@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, **kwargs):
+    """Смена пароля, блокировка и любые другие изменения
+    пользователя сбрасывают его токены из кеша."""
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        token_cache.delete(key)
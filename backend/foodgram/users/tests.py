@@ -0,0 +1,109 @@
+from core.models import Recipe
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import TokenCache, token_cache
+
+User = get_user_model()
+
+
+class RecipesCountTest(TestCase):
+    """Полное сохранение пользователя не перезаписывает recipes_count."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='Pass12345!'
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+
+    def create_recipe(self):
+        Recipe.objects.create(author=self.user, name='Рецепт', text='Текст',
+                              cooking_time=10)
+
+    def test_set_password(self):
+        # Пользователь попадает в кеш токенов с recipes_count=0.
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.create_recipe()
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'Pass12345!', 'new_password': 'NewPass123!'
+        })
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+        self.assertTrue(self.user.check_password('NewPass123!'))
+
+    def test_save_stale_user(self):
+        stale = User.objects.get(pk=self.user.pk)
+        self.create_recipe()
+        stale.first_name = 'Имя'
+        stale.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+        self.assertEqual(self.user.first_name, 'Имя')
+
+
+class TokenCacheTest(TestCase):
+    """Кеш токенов сбрасывается при выходе, смене пароля
+    и блокировке, в том числе в других процессах."""
+
+    def setUp(self):
+        token_cache._entries.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='Pass12345!'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def get_me(self):
+        return self.client.get('/api/users/me/').status_code
+
+    def test_cached(self):
+        self.assertEqual(self.get_me(), 200)
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(token_cache.get(self.token.key))
+
+    def test_logout(self):
+        self.assertEqual(self.get_me(), 200)
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me(), 401)
+
+    def test_password_change(self):
+        for current, new in (('Pass12345!', 'NewPass123!'),
+                             ('NewPass123!', 'OtherPass123!')):
+            response = self.client.post('/api/users/set_password/', {
+                'current_password': current, 'new_password': new
+            })
+            self.assertEqual(response.status_code, 204)
+
+    def test_deactivation(self):
+        self.assertEqual(self.get_me(), 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_me(), 401)
+
+    @override_settings(TOKEN_CACHE_MAX_SIZE=2)
+    def test_lru_bound(self):
+        cache = TokenCache()
+        for key in ('a', 'b', 'a', 'c'):
+            cache.set(key, key)
+        self.assertEqual(list(cache._entries), ['a', 'c'])
+        self.assertIsNone(cache.get('b'))
+
+    @override_settings(TOKEN_CACHE_ALIAS='default')
+    def test_other_process(self):
+        # Запись в памяти другого процесса сбрасывается
+        # по версии токена в общем кеше.
+        worker = TokenCache()
+        key = self.token.key
+        worker.set(key, (self.user, self.token), worker.get_version(key))
+        self.assertIsNotNone(worker.get(key, worker.get_version(key)))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(worker.get(key, worker.get_version(key)))
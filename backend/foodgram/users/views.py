@@ -1,14 +1,17 @@
 from http import HTTPStatus
 
 from api.paginators import PageLimitPagination
-from api.serializers import FollowSerializer, UserCustomSerializer
-from core.helpers import CustomModelViewSet
+from api.querysets import attach_recipe_previews, subscriptions_queryset
+from api.serializers import (FollowSerializer, UserCustomSerializer,
+                             get_recipes_limit)
+from core.helpers import CustomModelViewSet, create_or_error, delete_or_error
+from core.models import Follow
 from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-from rest_framework.serializers import ValidationError
 
 User = get_user_model()
 
@@ -18,16 +21,22 @@ class UsersViewSet(UserViewSet, CustomModelViewSet):
 
     queryset = User.objects.all().order_by('id')
     pagination_class = PageLimitPagination
+    cursor_ordering = ('id',)
     serializer_class = UserCustomSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     @action(methods=['get'], detail=False, url_path='subscriptions')
     def subscriptions(self, *args, **kwargs):
         user = self.request.user
-        queryset = User.objects.filter(following__user=user)
-        pagination = self.paginate_queryset(queryset)
+        queryset = subscriptions_queryset(user)
+        authors = attach_recipe_previews(
+            self.paginate_queryset(queryset),
+            get_recipes_limit(self.request)
+        )
+        for author in authors:
+            author.is_subscribed = True
         serializer = FollowSerializer(
-            pagination,
+            authors,
             many=True,
             context={'request': self.request}
         )
@@ -36,13 +45,9 @@ class UsersViewSet(UserViewSet, CustomModelViewSet):
     @action(methods=['post', 'delete'], detail=True, url_path='subscribe')
     def subscribe(self, *args, **kwargs):
         user = self.request.user
-        author = User.objects.get(pk=self.kwargs.get('id'))
-        obj = user.follower.filter(author=author)
+        author = get_object_or_404(User, pk=self.kwargs.get('id'))
         if self.request.method == 'POST':
-
-            if obj.exists():
-                raise ValidationError({'errors': 'Уже подписан.'})
-            user.follower.create(author=author)
+            create_or_error(Follow, 'Уже подписан.', user=user, author=author)
             serializer = FollowSerializer(
                 instance=author,
                 context={'request': self.request}
@@ -50,5 +55,6 @@ class UsersViewSet(UserViewSet, CustomModelViewSet):
             return Response(serializer.data)
 
         if self.request.method == 'DELETE':
-            obj.delete()
+            delete_or_error(Follow, 'Подписка не найдена.',
+                            user=user, author=author)
             return Response({'detail': 'Done'}, status=HTTPStatus.NO_CONTENT)